@@ -1,4 +1,5 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Clean repositories of generated files"
@@ -8,4 +9,5 @@ def add_parser_args(parser, argparse):
     ps.add_argument('repository', nargs='*', default=[], help="A list of paths or repositories to generate things in. ")
     ps.add_argument('--all', "-a", default=False, const=True, action="store_const", help="generates files for all repositories")
     parser.add_argument('--git-clean', '-g', action="store_true", default=False, help="Also run git clean over all the repositories. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to clean in parallel. Defaults to the number of CPUs. ")
     parser.epilog = repo_wildcard_local
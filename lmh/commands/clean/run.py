@@ -1,8 +1,13 @@
+from lmh.lib.io import buffered, write_buffer
+from lmh.lib.utils import parallel_map
 from lmh.lib.repos.local import match_repo_args, clean
 
 def do(args, unknown):
     repos = match_repo_args(args.repository, args.all)
+    clean_repo = buffered(lambda repo:clean(repo, git_clean = args.git_clean))
+
     res = True
-    for repo in repos:
-        res = clean(repo, git_clean = args.git_clean) and res
+    for (r, output) in parallel_map(clean_repo, repos, args.jobs):
+        write_buffer(output)
+        res = r and res
     return res
@@ -1,4 +1,5 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Commit all changed files"
@@ -8,4 +9,5 @@ def add_parser_args(parser, argparse):
     parser.add_argument('--message', "-m", default=["automatic commit by lmh"], nargs=1, help="message to be used for commits")
     parser.add_argument('--verbose', "-v", default=False, const=True, action="store_const", help="be verbose")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs commit on all repositories currently in lmh")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to commit in parallel. Defaults to the number of CPUs. ")
     parser.epilog = repo_wildcard_local
@@ -1,4 +1,5 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Crawl current repository for dependencies"
@@ -7,4 +8,6 @@ def add_parser_args(parser, argparse):
     parser.add_argument('repository', nargs='*', help="a list of repositories for which to show the status. ")
     parser.add_argument('--apply', metavar='apply', const=True, default=False, action="store_const", help="Writes found dependencies to MANIFEST.MF")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs commit on all repositories currently in lmh")
+    parser.add_argument('--stats', default=False, const=True, action="store_const", help="Show how many files were served from the dependency cache. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to crawl in parallel. Defaults to the number of CPUs. ")
     parser.epilog = repo_wildcard_local
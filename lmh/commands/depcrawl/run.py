@@ -4,7 +4,7 @@ from lmh.lib.repos.local import calc_deps,  match_repo_args
 def do(args, unknown):
     repos = match_repo_args(args.repository, args.all)
 
-    res = calc_deps(repos, apply=args.apply)
+    res = calc_deps(repos, apply=args.apply, stats=args.stats, jobs=args.jobs)
     
     if res:
         return True
@@ -0,0 +1,20 @@
+def about():
+    return "Query the dependency graph of all installed repositories"
+
+def add_parser_args(parser, argparse):
+    parser.add_argument('query', choices=["graph", "order", "cycles", "dependents", "dependencies"], help="What to show. ")
+    parser.add_argument('repository', nargs='*', help="Repositories to show dependents or dependencies of. ")
+    parser.add_argument('--format', '-f', choices=["json", "dot"], default="json", help="Output format for graph. Defaults to json. ")
+    parser.add_argument('--transitive', '-t', default=False, const=True, action="store_const", help="Also show indirect dependents or dependencies. ")
+    parser.add_argument('--refresh', default=False, const=True, action="store_const", help="Crawl all repositories for imports instead of using the dependency cache. ")
+    parser.epilog = """
+The dependency graph contains the dependencies listed in each MANIFEST.MF
+and the repositories each repository imports modules from. Imports are taken
+from the cache written by lmh depcrawl unless --refresh is given.
+
+    graph          Print the whole graph as JSON or in the DOT language.
+    order          Print all repositories so that each comes after its
+                   dependencies.
+    cycles         Print groups of repositories that depend on each other.
+    dependents     Print the repositories depending on the given ones.
+    dependencies   Print the repositories the given ones depend on. """
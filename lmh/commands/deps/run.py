@@ -0,0 +1,32 @@
+import json
+
+from lmh.lib.io import std, err
+from lmh.lib.repos.local.dirs import match_repo
+from lmh.lib.repos.local.graph import get_dependency_graph
+
+def do(args, unknown):
+    if args.query in ["dependents", "dependencies"] and len(args.repository) == 0:
+        err("At least one repository is required for", args.query)
+        return False
+
+    graph = get_dependency_graph(refresh=args.refresh)
+
+    if args.query == "graph":
+        if args.format == "dot":
+            std(graph.to_dot())
+        else:
+            std(json.dumps(graph.to_json(), indent=4, sort_keys=True))
+    elif args.query == "order":
+        for r in graph.topological_order():
+            std(r)
+    elif args.query == "cycles":
+        for c in graph.cycles():
+            std(" ".join(c))
+    else:
+        f = graph.dependents if args.query == "dependents" else graph.dependencies
+        for spec in args.repository:
+            rep = match_repo(spec) or spec
+            for r in f(rep, transitive=args.transitive):
+                std(r)
+
+    return True
@@ -1,4 +1,5 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Find tool"
@@ -7,6 +8,9 @@ def add_parser_args(parser, argparse):
     parser.add_argument('matcher', metavar='matcher', help="RegEx matcher on the path of the module")
     parser.add_argument('--replace', nargs=1, help="Replace string")
     parser.add_argument('--apply', metavar='apply', const=True, default=False, action="store_const", help="Option specifying that files should be changed")
+    parser.add_argument('--dry-run', '-n', default=False, const=True, action="store_const", help="Show the changes --replace would make as a unified diff without changing any files. ")
     parser.add_argument('repository', nargs='*', help="a list of repositories for which to show the status. ")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs a git command on all repositories currently in lmh")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of processes to search with. Defaults to the number of CPUs. ")
+    parser.add_argument('--no-index', dest="use_index", default=True, action="store_false", help="Search all files even if the repository has an index. See lmh index. ")
     parser.epilog = repo_wildcard_local
@@ -2,9 +2,7 @@ from lmh.lib.repos.local import match_repo_args
 from lmh.lib.repos.find_and_replace import find
 
 def do(args, unknown):
-    ret = True
     repos = match_repo_args(args.repository, args.all)
-    for rep in repos:
-        ret = find(rep, args) and ret
+    replace = args.replace[0] if (args.apply or args.dry_run) and args.replace != None else None
 
-    return ret
+    return find(repos, args.matcher, replace, jobs=args.jobs, use_index=args.use_index, dry_run=args.dry_run)
@@ -8,5 +8,7 @@ def add_parser_args(parser, argparse):
     parser.add_argument('cmd', nargs=1, help="a git command to be run.")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs a git command on all repositories currently in lmh")
     parser.add_argument('--args', nargs='+', help="Arguments to add to each of the git commands. ")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Number of repositories to run the git command in at the same time. Output is grouped by repository unless --prefix is given. ")
+    parser.add_argument('--prefix', '-p', default=False, action="store_true", help="Print output as soon as it is available with each line prefixed by the repository name. ")
     parser.add_argument('repository', nargs='*', help="a list of repositories for which to run the git command.")
     parser.epilog = repo_wildcard_local
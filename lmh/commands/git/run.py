@@ -1,7 +1,12 @@
+import shlex
+
 from lmh.lib.repos.local import match_repo_args
 from lmh.lib.repos.local import do as local_do
 
 def do(args, unknown):
     repos = match_repo_args(args.repository, args.all)
-    args.args = (args.args or []) + unknown
-    return local_do(args.cmd[0], args.args, *repos)
+
+    # --args may hold several arguments in one string, unknown ones are
+    # already split by the shell.
+    args.args = [a for arg in (args.args or []) for a in shlex.split(arg)] + unknown
+    return local_do(args.cmd[0], args.args, *repos, jobs=args.jobs, prefix=args.prefix)
@@ -0,0 +1,17 @@
+from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
+
+def about():
+    return "Build the search index used by lmh find"
+
+def add_parser_args(parser, argparse):
+    parser.add_argument('repository', nargs='*', help="a list of repositories to index. ")
+    parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="index all repositories currently in lmh")
+    parser.add_argument('--remove', default=False, const=True, action="store_const", help="Remove the index instead of updating it. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to index in parallel. Defaults to the number of CPUs. ")
+    parser.epilog = repo_wildcard_local + """
+
+The index remembers which files contain which pieces of text, so that lmh find
+only needs to search files that can match. Updating it only reads files that
+changed. lmh find still searches files that changed since the last update,
+so a stale index gives correct results, just more slowly. """
@@ -0,0 +1,18 @@
+from lmh.lib.io import std
+from lmh.lib.utils import process_map
+from lmh.lib.repos.local import match_repo_args, match_repo
+from lmh.lib.repos.index import update_index, remove_index
+
+def do(args, unknown):
+    repos = [match_repo(r) for r in match_repo_args(args.repository, args.all)]
+
+    if args.remove:
+        ret = True
+        for rep in repos:
+            ret = remove_index(rep) and ret
+        return ret
+
+    for (rep, stats) in zip(repos, process_map(update_index, repos, args.jobs)):
+        std("Indexed", rep+":", stats["indexed"], "files,", stats["updated"], "updated,", stats["removed"], "removed")
+
+    return True
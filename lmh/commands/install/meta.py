@@ -1,10 +1,17 @@
+from lmh.lib.utils import default_jobs
+
 def about():
     return "Fetch a MathHub repository and its dependencies"
 
 def add_parser_args(parser, argparse):
     parser.add_argument('spec', nargs='*', help="A list of repository specs to install. If no repositories are given, check if all depependencies are installed. ")
     parser.add_argument('-y', '--no-confirm-install', action="store_true", default=False, help="Do not prompt before installing. ")
+    parser.add_argument('--shallow', action="store_true", default=False, help="Only clone recent history. Uses install::clone_depth or a depth of 1 if it is not set. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to install in parallel. Defaults to the number of CPUs. ")
     parser.epilog = """
 Use install::sources to configure the sources of repositories.
 
-Use install::noglobs to disable globbing for lmh install. """
+Use install::noglobs to disable globbing for lmh install.
+
+Use install::clone_depth and install::clone_filter to make shallow or partial
+clones. Shallow clones can be deepened with lmh pull --deepen. """
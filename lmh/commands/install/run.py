@@ -9,7 +9,7 @@ def do(args, unknown):
     # If there are no repositories, check everything for dependencies.
     if len(args.spec) == 0:
         std("Nothing to install, re-installing all existing repositories.  ")
-        return install(*match_repos(lmh_locate("content")))
+        return install(*match_repos(lmh_locate("content")), jobs=args.jobs, shallow=args.shallow)
 
     if not get_config("install::noglobs"):
         args.spec = ls_remote(*args.spec)
@@ -26,4 +26,4 @@ def do(args, unknown):
                 return False
 
 
-    return install(*args.spec)
+    return install(*args.spec, jobs=args.jobs, shallow=args.shallow)
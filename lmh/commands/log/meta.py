@@ -1,10 +1,14 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Show recent commits in all repositories"
 
 def add_parser_args(parser, argparse):
     parser.add_argument('--ordered', "-o", default=False, const=True, action="store_const", help="Orders log output by time (instead of by repository). ")
+    parser.add_argument('--max-count', '-n', type=int, default=None, dest="limit", help="Show at most this many commits. ")
+    parser.add_argument('--since', default=None, help="Show only commits more recent than a specific date. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to read in parallel. Defaults to the number of CPUs. ")
     parser.add_argument('repository', nargs='*', help="a list of repositories for which to show the log. ")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs log on all repositories currently in lmh")
     parser.epilog = repo_wildcard_local
@@ -2,4 +2,4 @@ from lmh.lib.repos.local import match_repo_args, log
 
 def do(args, unknown):
     repos = match_repo_args(args.repository, args.all)
-    return log(args.ordered, *repos)
+    return log(args.ordered, *repos, limit=args.limit, since=args.since, jobs=args.jobs)
@@ -5,4 +5,5 @@ def about():
 
 def add_parser_args(parser, argparse):
     parser.add_argument('spec', nargs='*', help="list of repository specefiers. ")
+    parser.add_argument('--offline', action="store_true", default=False, help="Only use the catalog of remote repositories from the last run. ")
     parser.epilog = repo_wildcard_remote
@@ -1,3 +1,5 @@
+from lmh.lib.utils import default_jobs
+
 def about():
     return "Manage all locally installed repositories"
 
@@ -6,3 +8,4 @@ def add_parser_args(parser, argparse):
     group.add_argument("--export", dest="dump_action", action="store_const", const=0, default=0, help="Dump list of installed repositories in file. ")
     group.add_argument("--import", dest="dump_action", action="store_const", const=1, help="Install repositories listed in file. ")
     parser.add_argument("file", nargs="?", help="File to use. If not given, assume STDIN or STDOUT respectivelsy. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to install in parallel when importing. Defaults to the number of CPUs. ")
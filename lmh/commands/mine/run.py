@@ -14,7 +14,7 @@ def do(args, unknown):
     else:
         if not args.file:
             #Read frm stdin
-            return restore()
+            return restore(jobs=args.jobs)
         else:
             #Read from file
-            return restore(os.path.abspath(args.file[0]))
+            return restore(os.path.abspath(args.file[0]), jobs=args.jobs)
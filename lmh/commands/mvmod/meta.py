@@ -7,6 +7,7 @@ def add_parser_args(parser, argparse):
     parser.add_argument('module', nargs="+", help="Relative path(s) of source module(s) in old repository")
     parser.add_argument('--no-depcrawl', action="store_const", default=False, const=True, help="Do not call depcrawl on source and destination. ")
     parser.add_argument('--simulate', action="store_const", default=False, const=True, help="Simulate only. ")
+    parser.add_argument('--dry-run', '-n', action="store_const", default=False, const=True, help="Do not move or change any files, but show the changes to them as a unified diff. ")
 
     parser.epilog = """
 Example: lmh mvmod smglom/smglom smglom/set set
@@ -14,5 +15,9 @@ Example: lmh mvmod smglom/smglom smglom/set set
 Which moves the multilingual set module from smglom/smglom into the new
 repository smglom/set.
 
+Only imports naming the module (e.g. \\gimport[smglom/smglom]{set}) are
+updated. Imports by path, such as \\usemodule[...] or \\MathHub{...}, are
+left unchanged and have to be fixed by hand.
+
 It can be advisable to run an lmh clean before executing this command, as it
 speeds it up quite a lot. """
@@ -4,4 +4,4 @@ def do(args, unknown):
     args.source = args.source[0]
     args.dest = args.dest[0]
 
-    return movemod(args.source, args.dest, args.module, args.no_depcrawl, simulate=args.simulate)
+    return movemod(args.source, args.dest, args.module, args.no_depcrawl, simulate=args.simulate, dry_run=args.dry_run)
@@ -0,0 +1,15 @@
+def about():
+    return "Manage the shared object cache for repositories"
+
+def add_parser_args(parser, argparse):
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--init', help='Create the shared object cache. ', action='store_true')
+    mode.add_argument('--gc', help='Repack and garbage collect the shared object cache. ', action='store_true')
+    mode.add_argument('--status', help='Show information about the shared object cache. Default. ', action='store_true')
+    parser.epilog = """
+The shared object cache is a local git repository that holds the objects of all
+installed repositories. lmh install uses it to borrow objects instead of
+downloading them again.
+
+Use install::object_cache to enable it and install::object_cache_path to
+configure where it is stored. """
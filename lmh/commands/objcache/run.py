@@ -0,0 +1,10 @@
+from lmh.lib.repos.git.objects import init_object_cache, gc_object_cache, print_object_cache
+
+def do(args, unknown):
+    if args.init:
+        return init_object_cache()
+
+    if args.gc:
+        return gc_object_cache()
+
+    return print_object_cache()
@@ -1,4 +1,5 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Get repository and tool updates"
@@ -7,6 +8,10 @@ def add_parser_args(parser, argparse):
     parser.add_argument('repository', nargs='*', help="a list of repositories which should be updated. ")
     parser.add_argument('--verbose', "-v", default=False, const=True, action="store_const", help="be verbose")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="updates all repositories currently in lmh")
+    depth = parser.add_mutually_exclusive_group()
+    depth.add_argument('--deepen', type=int, default=None, metavar="N", help="Fetch N more commits of history for shallow clones. ")
+    depth.add_argument('--unshallow', action="store_const", const=0, dest="deepen", help="Fetch the full history for shallow clones. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to update in parallel. Defaults to the number of CPUs. ")
     parser.epilog = """
 Note: LMH will check for tool updates only if run at the root of the LMH
 folder. """+repo_wildcard_local
@@ -6,4 +6,4 @@ from lmh.lib.config import get_config
 
 def do(args, unknown):
     repos = match_repo_args(args.repository, args.all)
-    return pull(args.verbose, *repos)
+    return pull(args.verbose, *repos, jobs=args.jobs, deepen=args.deepen)
@@ -1,4 +1,5 @@
 from lmh.lib.help import repo_wildcard_local
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Send changes to MathHub"
@@ -7,4 +8,6 @@ def add_parser_args(parser, argparse):
     parser.add_argument('repository', nargs='*', help="a list of repositories for which to show the status. ")
     parser.add_argument('--verbose', "-v", default=False, const=True, action="store_const", help="be verbose")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs status on all repositories currently in lmh")
+    parser.add_argument('--no-fetch', dest="fetch", default=True, action="store_false", help="Decide what to push using the state of the last fetch instead of fetching. ")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to push in parallel. Defaults to the number of CPUs. ")
     parser.epilog = repo_wildcard_local
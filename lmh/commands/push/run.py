@@ -3,4 +3,4 @@ from lmh.lib.repos.git.push import push
 
 def do(args, unknown):
     repos = match_repo_args(args.repository, args.all)
-    return push(args.verbose, *repos)
+    return push(args.verbose, *repos, jobs=args.jobs, fetch=args.fetch)
@@ -7,6 +7,8 @@ def add_parser_args(parser, argparse):
     parser.add_argument('repository', nargs='*', help="a list of repositories which should be checked. ")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="updates all repositories currently in lmh")
 
+    parser.add_argument('--no-fetch', dest="fetch", default=True, action="store_false", help="Do not fetch from the remote, use the state of the last fetch instead. ")
+
     modes = parser.add_mutually_exclusive_group()
 
     modes.add_argument("--human", dest="mode", default="human", action="store_const", const="human", help="Show information in human-redable form. Default. ")
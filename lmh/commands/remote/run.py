@@ -6,17 +6,17 @@ from lmh.lib.config import get_config
 
 def do(args, unknown):
     def needs_push(r):
-        state = get_remote_status(r)
+        state = get_remote_status(r, args.fetch)
         return state == "push" or state == "failed" or state == "divergence"
     def needs_pull(r):
-        state = get_remote_status(r)
-        return state == "push" or state == "failed" or state == "divergence"
+        state = get_remote_status(r, args.fetch)
+        return state == "pull" or state == "failed" or state == "divergence"
 
     repos = match_repo_args(args.repository, args.all)
 
     if args.mode == "human":
         for r in repos:
-            state = get_remote_status(r)
+            state = get_remote_status(r, args.fetch)
             if state == "ok":
                 std(r, "Synced")
             elif state == "push":
@@ -26,7 +26,7 @@ def do(args, unknown):
             elif state == "divergence":
                 std(r, "Diverged from remote")
     elif args.mode == "synced":
-        [std(r) for r in repos if get_remote_status(r) == "ok"]
+        [std(r) for r in repos if get_remote_status(r, args.fetch) == "ok"]
     elif args.mode == "push":
         [std(r) for r in repos if needs_push(r)]
     elif args.mode == "pull":
@@ -5,7 +5,7 @@ def about():
 
 def add_parser_args(parser, argparse):
     parser.add_argument('--directory', '-d', default=os.getcwd(), help="Directory to replace symbols in. Defaults to current directory. ")
-    parser.add_argument('--simulate', '-s', default=False, action="store_const", const=True, help="Simulate only. ")
+    parser.add_argument('--simulate', '--dry-run', '-s', dest="simulate", default=False, action="store_const", const=True, help="Simulate only, showing the changes as a unified diff. ")
     parser.add_argument('renamings', nargs="+", help="Renamings to be provided in pairs. ", default=None)
 
     parser.epilog = """
@@ -1,5 +1,6 @@
 from lmh.lib.help import repo_wildcard_local
 from lmh.lib.config import get_config
+from lmh.lib.utils import default_jobs
 
 def about():
     return "Show the working tree status of repositories"
@@ -10,6 +11,7 @@ def add_parser_args(parser, argparse):
     remotes = parser.add_mutually_exclusive_group()
     remotes.add_argument('--remote', '-r', action="store_const", const=True, default=get_config("gl::status_remote_enabled"), dest="remote", help="Enable checking remote for status. Default can be changed by gl::status_remote_enabled. ")
     remotes.add_argument('--no-remote', '-n', action="store_const", const=False, dest="remote", help="Disable checking remote for status. See --remote")
+    parser.add_argument('--no-fetch', dest="fetch", default=True, action="store_false", help="When checking the remote, use the state of the last fetch instead of fetching. ")
 
     logtype = parser.add_argument_group("Status Output format ").add_mutually_exclusive_group()
     logtype.add_argument('--long', action="store_const", dest="outputtype", default="--long", const="--long", help="Give the output in the long-format. This is the default.")
@@ -18,4 +20,5 @@ def add_parser_args(parser, argparse):
 
     parser.add_argument('repository', nargs='*', help="a list of repositories for which to show the status. ")
     parser.add_argument('--all', "-a", default=False, const=True, action="store_const", help="runs status on all repositories currently in lmh")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(), help="Number of repositories to check in parallel. Defaults to the number of CPUs. ")
     parser.epilog = repo_wildcard_local
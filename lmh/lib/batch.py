@@ -0,0 +1,221 @@
+"""
+Batches of file writes that are applied all at once or not at all.
+
+Changes are staged in memory and written on commit. Each file is written to
+a temporary file next to it and synced to disk. Only once all of them are
+written are the temporary files renamed over the originals and their
+directories synced. If anything goes wrong (or the user interrupts lmh) the
+files that were already replaced are restored the same way, so a batch is
+never half-applied.
+"""
+
+import os
+import os.path
+import sys
+import stat
+import difflib
+import tempfile
+import collections
+
+from lmh.lib.io import std, err, is_string, read_file
+
+class WriteBatch:
+    def __init__(self, dry_run = False):
+        """
+            Creates a new batch.
+
+            @param dry_run {boolean} Print a unified diff of each change on
+                commit instead of writing anything.
+        """
+
+        self.dry_run = dry_run
+
+        # staged files in order, with old and new content.
+        self.staged = collections.OrderedDict()
+
+    def read(self, filename):
+        """
+            Reads a file, taking into account changes staged in this batch.
+        """
+
+        filename = os.path.abspath(filename)
+
+        if filename in self.staged:
+            return self.staged[filename][1]
+
+        return read_file(filename)
+
+    def write(self, filename, text, old = None):
+        """
+            Stages a write to a file. Files whose content does not change are
+            not written on commit.
+
+            @param filename {string} File to write.
+            @param text {string|string[]} New content, either as text or as
+                a list of lines.
+            @param old {string} Current content of the file, if known.
+
+            @returns {boolean} If the file changes.
+        """
+
+        filename = os.path.abspath(filename)
+
+        if not is_string(text):
+            text = "\n".join(text) + "\n"
+
+        if filename in self.staged:
+            old = self.staged[filename][0]
+        elif old == None:
+            try:
+                old = read_file(filename)
+            except FileNotFoundError:
+                old = None
+
+        self.staged[filename] = (old, text)
+        return old != text
+
+    def changed(self):
+        """
+            Returns the files changed by this batch, in the order they were
+            first written.
+        """
+
+        return [f for (f, (old, new)) in self.staged.items() if old != new]
+
+    def print_diff(self):
+        """
+            Prints a unified diff of all staged changes.
+        """
+
+        for f in self.changed():
+            (old, new) = self.staged[f]
+            rel = os.path.relpath(f)
+            diff = difflib.unified_diff(
+                [] if old == None else old.splitlines(True),
+                new.splitlines(True),
+                "/dev/null" if old == None else "a/"+rel, "b/"+rel
+            )
+            for line in diff:
+                std(line, newline=not line.endswith("\n"))
+
+    def commit(self):
+        """
+            Writes all staged changes, or prints them in a dry run.
+
+            @returns {boolean}
+        """
+
+        if self.dry_run:
+            self.print_diff()
+            return True
+
+        files = self.changed()
+
+        if len(files) == 0:
+            return True
+
+        temps = {}
+        replaced = []
+
+        # new files get the default mode, i.e. the one open() would give them.
+        umask = os.umask(0)
+        os.umask(umask)
+
+        try:
+            # Write everything into temporary files.
+            for f in files:
+                if self.staged[f][0] == None:
+                    mode = 0o666 & ~umask
+                else:
+                    mode = stat.S_IMODE(os.stat(f).st_mode)
+
+                temps[f] = write_temp(f, self.staged[f][1], mode)
+
+            # and put them in place.
+            for f in files:
+                os.replace(temps[f], f)
+                del temps[f]
+                replaced.append(f)
+        except BaseException as e:
+            err("Unable to write changes, rolling back:", e)
+
+            for temp in temps.values():
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+
+            self.rollback(replaced)
+
+            if not isinstance(e, Exception):
+                raise
+            return False
+
+        self.sync_dirs(files)
+
+        self.staged = collections.OrderedDict()
+        return True
+
+    def rollback(self, replaced):
+        """
+            Restores the original content of files that were already replaced.
+            Like on commit, the content is written to a temporary file first,
+            so a file is never left truncated.
+        """
+
+        for f in reversed(replaced):
+            old = self.staged[f][0]
+
+            try:
+                if old == None:
+                    os.remove(f)
+                else:
+                    os.replace(write_temp(f, old, stat.S_IMODE(os.stat(f).st_mode)), f)
+            except OSError:
+                err("Unable to restore", f)
+
+    def sync_dirs(self, files):
+        """
+            Makes sure renames in the directories of the given files are
+            written to disk.
+        """
+
+        if sys.platform.startswith("win"):
+            return
+
+        for d in set([os.path.dirname(f) for f in files]):
+            try:
+                fd = os.open(d, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+
+def write_temp(filename, text, mode):
+    """
+        Writes text into a new temporary file next to a file and syncs it to
+        disk.
+
+        @param filename {string} File the temporary file is for.
+        @param text {string} Content to write.
+        @param mode {int} Permissions of the temporary file.
+
+        @returns {string} Name of the temporary file.
+    """
+
+    (fd, temp) = tempfile.mkstemp(dir=os.path.dirname(filename), prefix="."+os.path.basename(filename)+".", suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf8") as tf:
+            tf.write(text)
+            tf.flush()
+            os.fsync(tf.fileno())
+
+        os.chmod(temp, mode)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+    return temp
@@ -18,6 +18,9 @@ data_dir_name = "MathHub"
 """Name of the external directory"""
 ext_dir_name = "ext"
 
+"""Name of the cache directory (inside the data directory)"""
+cache_dir_name = ".lmh"
+
 @cached
 def lmh_locate(*paths):
     """
@@ -33,6 +36,8 @@ def lmh_locate(*paths):
         external dependencies
     3. "lib" the path will be resolved relative to the lmh directory that contains
         all python source code
+    4. "cache" the path will be resolved relative to the directory that
+        contains caches for the content repositories
     """
 
     p = list(paths)
@@ -45,5 +50,7 @@ def lmh_locate(*paths):
             p[0] = ext_dir_name
         elif p[0] == "lib":
             p[0] = lib_dir_name
+        elif p[0] == "cache":
+            p[0:1] = [data_dir_name, cache_dir_name]
 
     return os.path.join(install_dir, *p)
@@ -1,19 +1,57 @@
-import sys
+import re
 import os, os.path
 import subprocess
 
 from lmh.lib.env import git_executable
+from lmh.lib.io import is_buffered, write_out
+from lmh.lib.runner import run, PIPE, DEVNULL, STDOUT
 
 def do(dest, cmd, *arg):
     """
     Does an arbitrary git command and returns if it suceeded
     """
 
+    return do_code(dest, cmd, *arg) == 0
+
+def do_code(dest, cmd, *arg):
+    """
+    Does an arbitrary git command and returns its exit code
+    """
+
+    args = [git_executable, cmd]
+    args.extend(arg)
+
+    # If our output is buffered, we need to capture it.
+    if is_buffered():
+        (code, out, errout) = run(args, cwd=dest)
+        write_out(out.decode("utf-8", "replace"))
+        write_out(errout.decode("utf-8", "replace"), True)
+    else:
+        (code, out, errout) = run(args, cwd=dest, stdout=None, stderr=None)
+
+    # the command might have changed branches.
+    forget_branch_status(dest)
+
+    return code
+
+def do_prefixed(dest, prefix, cmd, *arg):
+    """
+    Does an arbitrary git command, writes each line of output with a prefix as
+    soon as it is available and returns the exit code
+    """
+
     args = [git_executable, cmd]
     args.extend(arg)
-    proc = subprocess.Popen(args, stderr=sys.stderr, stdout=sys.stdout, cwd=dest)
-    proc.wait()
-    return (proc.returncode == 0)
+
+    def on_line(line):
+        write_out(prefix + line.decode("utf-8", "replace").rstrip("\n") + "\n")
+
+    (code, out, errout) = run(args, cwd=dest, stderr=STDOUT, on_line=on_line)
+
+    # the command might have changed branches.
+    forget_branch_status(dest)
+
+    return code
 
 def do_quiet(dest, cmd, *arg):
     """
@@ -22,9 +60,8 @@ def do_quiet(dest, cmd, *arg):
 
     args = [git_executable, cmd]
     args.extend(arg)
-    proc = subprocess.Popen(args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, cwd=dest)
-    proc.wait()
-    return (proc.returncode == 0)
+    (code, out, errout) = run(args, cwd=dest, stdout=DEVNULL, stderr=DEVNULL)
+    return (code == 0)
 
 def do_data(dest, cmd, *arg):
     """
@@ -33,10 +70,23 @@ def do_data(dest, cmd, *arg):
 
     args = [git_executable, cmd]
     args.extend(arg)
-    proc = subprocess.Popen(args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, cwd=dest)
-    proc.wait()
-    data = proc.communicate()
-    return [data[0].decode("utf-8"), data[1].decode("utf-8")]
+    (code, out, errout) = run(args, cwd=dest)
+    return [out.decode("utf-8"), errout.decode("utf-8")]
+
+def do_output(dest, cmd, *arg):
+    """
+    Does an arbitrary git command and returns stdout. Raises
+    subprocess.CalledProcessError with git's stderr if the command fails.
+    """
+
+    args = [git_executable, cmd]
+    args.extend(arg)
+    (code, out, errout) = run(args, cwd=dest)
+
+    if code != 0:
+        raise subprocess.CalledProcessError(code, args, stderr=errout)
+
+    return out.decode("utf-8", "replace")
 
 ### SIMPLE ALIASES
 def clone(dest, *arg):
@@ -71,10 +121,9 @@ def status(dest, *arg):
 
     args = [git_executable, "status"];
     args.extend(arg)
-    proc = subprocess.Popen(args, stderr=sys.stderr, stdout=subprocess.PIPE, cwd=dest)
-    proc.wait()
-    if(proc.returncode == 0):
-        return proc.communicate()[0]
+    (code, out, errout) = run(args, cwd=dest, stderr=None)
+    if(code == 0):
+        return out.decode("utf-8")
     else:
         return False
 def status_pipe(dest, *arg):
@@ -84,9 +133,8 @@ def status_pipe(dest, *arg):
 
     args = [git_executable, "status"];
     args.extend(arg)
-    proc = subprocess.Popen(args, stdout=sys.stdout, stderr=sys.stderr, cwd=dest)
-    proc.wait()
-    if(proc.returncode == 0):
+    (code, out, errout) = run(args, cwd=dest, stdout=None, stderr=None)
+    if(code == 0):
         return True
     else:
         return False
@@ -102,39 +150,133 @@ def exists(dest, askpass=True):
     if not askpass:
         env["GIT_TERMINAL_PROMPT"] = "0"
         env["GIT_ASKPASS"] = "/bin/echo"
-    proc = subprocess.Popen(args, env=env, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-    proc.wait()
-    return (proc.returncode == 0)
+    (code, out, errout) = run(args, env=env, stdout=DEVNULL, stderr=DEVNULL)
+    return (code == 0)
+
+def git_dir_state(dest):
+    """
+    Checks if dest is the root of a git working tree by only looking at the
+    filesystem. Returns True or False if this can be decided and None if we
+    have to ask git.
+    """
+
+    # git might be configured to look elsewhere.
+    if "GIT_DIR" in os.environ or "GIT_WORK_TREE" in os.environ:
+        return None
+
+    dotgit = os.path.join(dest, ".git")
+
+    if os.path.isfile(dotgit):
+        # a gitfile, as used by submodules and worktrees.
+        try:
+            with open(dotgit, "r") as f:
+                line = f.readline().strip()
+        except:
+            return None
+        if not line.startswith("gitdir:"):
+            return None
+        gitdir = os.path.join(dest, line[len("gitdir:"):].strip())
+    elif os.path.isdir(dotgit):
+        gitdir = dotgit
+    elif os.path.exists(dotgit):
+        return None
+    else:
+        # nothing here, so this is not the root of a repository.
+        return False
+
+    # Check that HEAD is a valid reference.
+    try:
+        with open(os.path.join(gitdir, "HEAD"), "r") as f:
+            head = f.readline().strip()
+    except:
+        return None
+
+    if not (head.startswith("ref: refs/") or re.match("^[0-9a-f]{40}$", head)):
+        return None
+
+    # and that there are objects and refs.
+    if os.path.isdir(os.path.join(gitdir, "objects")) and os.path.isdir(os.path.join(gitdir, "refs")):
+        return True
+
+    # might be a worktree using a common directory.
+    return None
 
 def is_repo(dest):
     """
-    Checks if a git repository exists (locally). 
+    Checks if a git repository exists (locally).
     """
 
-    try:
-        args = [git_executable, "rev-parse", dest]
-        proc = subprocess.Popen(args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, cwd=dest)
-        proc.wait()
+    dest = os.path.abspath(dest)
 
-        if (proc.returncode == 0):
-            return os.path.realpath(root_dir(dest)) == os.path.realpath(dest)
-        else:
-            return False
-    except:
+    if dest in is_repo.cache:
+        return True
+
+    if not os.path.isdir(dest):
         return False
 
+    state = git_dir_state(dest)
+
+    # we could not decide, so ask git.
+    if state == None:
+        try:
+            args = [git_executable, "rev-parse", dest]
+            (code, out, errout) = run(args, cwd=dest, stdout=DEVNULL, stderr=DEVNULL)
+
+            if (code == 0):
+                state = os.path.realpath(git_root_dir(dest)) == os.path.realpath(dest)
+            else:
+                state = False
+        except:
+            state = False
+
+    # Only remember repositories, others might still be created.
+    if state:
+        is_repo.cache.add(dest)
+
+    return state
+
+is_repo.cache = set()
+
+def is_shallow(dest):
+    """
+    Checks if a local git repository is a shallow clone.
+    """
+
+    return do_data(dest, "rev-parse", "--is-shallow-repository")[0].strip() == "true"
+
 def root_dir(dir = "."):
     """
-    Finds the git root dir of the given path. 
+    Finds the git root dir of the given path.
+    """
+
+    if os.path.isfile(dir):
+        dir = os.path.dirname(dir)
+
+    # walk up until we find the repository
+    path = os.path.abspath(dir)
+    while True:
+        state = git_dir_state(path)
+        if state == None:
+            break
+        if state:
+            return os.path.realpath(path)
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+    return git_root_dir(dir)
+
+def git_root_dir(dir = "."):
+    """
+    Finds the git root dir of the given path by asking git.
     """
 
     if os.path.isfile(dir):
         dir = os.path.dirname(dir)
 
-    rootdir = subprocess.Popen([git_executable, "rev-parse", "--show-toplevel"],
-                                                            stdout=subprocess.PIPE,
-                                                            cwd=dir,
-                                                            ).communicate()[0]
+    rootdir = run([git_executable, "rev-parse", "--show-toplevel"], cwd=dir, stderr=None)[1]
     rootdir = rootdir.strip()
     return rootdir.decode("utf-8")
 
@@ -146,38 +288,111 @@ def is_tracked(file):
     p = os.path.dirname(f)
 
     args = [git_executable, "ls-files", f, "--error-unmatch"]
-    proc = subprocess.Popen(args, cwd=p, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-    proc.wait()
-    return (proc.returncode == 0)
+    (code, out, errout) = run(args, cwd=p, stdout=DEVNULL, stderr=DEVNULL)
+    return (code == 0)
 
-def get_remote_status(where):
+def tracked_files(dest):
     """
-    Checks if a remote can be updated or not
+    Returns a set of absolute paths of all files tracked by git in a directory.
+    """
+
+    dest = os.path.abspath(dest)
+    files = do_data(dest, "ls-files", "-z")[0].split("\0")
+    return set([os.path.join(dest, f) for f in files if f != ""])
+
+def get_branch_status(where, fetch = True):
+    """
+    Computes how far all local branches are ahead of or behind their upstream.
+    Uses a single fetch (unless fetch is False) and a single for-each-ref.
+    Returns a dictionary mapping branch names to (ahead, behind, is_head)
+    tuples, with ahead and behind None if the branch has no upstream, or False
+    if the fetch failed.
     """
-    
+
+    where = os.path.realpath(where)
+
+    if (where, fetch) in get_branch_status.cache:
+        return get_branch_status.cache[(where, fetch)]
+
     # quietly make an update with the remote
-    if not do_quiet(where, "remote", "update"):
+    if fetch and not do_quiet(where, "remote", "update"):
+        return False
+
+    fmt = "%(refname:short)%00%(HEAD)%00%(upstream)%00%(upstream:track,nobracket)"
+
+    branches = {}
+
+    for line in do_data(where, "for-each-ref", "--format="+fmt, "refs/heads")[0].split("\n"):
+        if line == "":
+            continue
+
+        (name, head, upstream, track) = line.split("\0")
+
+        ahead = None
+        behind = None
+
+        if upstream != "" and track != "gone":
+            ahead = 0
+            behind = 0
+            for part in track.split(","):
+                part = part.strip().split(" ")
+                if part[0] == "ahead":
+                    ahead = int(part[1])
+                elif part[0] == "behind":
+                    behind = int(part[1])
+
+        branches[name] = (ahead, behind, head == "*")
+
+    get_branch_status.cache[(where, fetch)] = branches
+    if fetch:
+        # we also know the status without fetching now.
+        get_branch_status.cache[(where, False)] = branches
+
+    return branches
+
+get_branch_status.cache = {}
+
+def forget_branch_status(where):
+    """
+    Removes the branch status of a repository from the cache, so that it is
+    computed again after the repository has been changed (e.g. by a pull,
+    commit or push).
+    """
+
+    where = os.path.realpath(where)
+
+    for fetch in [True, False]:
+        get_branch_status.cache.pop((where, fetch), None)
+
+def get_remote_status(where, fetch = True):
+    """
+    Checks if a remote can be updated or not
+    """
+
+    branches = get_branch_status(where, fetch)
+
+    if branches == False:
         return "failed"
 
     # Figure out my branch
-    my_branch = do_data(where, "rev-parse", "--abbrev-ref", "HEAD")[0].split("\n")[0]
-    # And the upstream url
-    my_upstream = do_data(where, "symbolic-ref", "-q", "HEAD")[0].split("\n")[0]
-    my_upstream = do_data(where, "for-each-ref", "--format=%(upstream:short)", my_upstream)[0].split("\n")[0]
-
-    # Turn it into hashes
-    local = do_data(where, "rev-parse", my_branch)
-    remote = do_data(where, "rev-parse", my_upstream)
-    base = do_data(where, "merge-base", my_branch, my_upstream)
-
-    if local == remote:
-        return "ok"
-    elif local == base:
-        return "pull"
-    elif remote == base:
-        return "push"
-    else:
-        return "divergence"
+    for (ahead, behind, head) in branches.values():
+        if not head:
+            continue
+
+        if ahead == None:
+            return "failed"
+        elif ahead == 0 and behind == 0:
+            return "ok"
+        elif ahead == 0:
+            return "pull"
+        elif behind == 0:
+            return "push"
+        else:
+            return "divergence"
+
+    # We are not on a branch.
+    return "failed"
+
 def make_orphan_branch(dest, name):
     """
     Creates an orphaned branch
@@ -185,29 +400,25 @@ def make_orphan_branch(dest, name):
 
     # true | git mktree
     args = [git_executable, "mktree"]
-    proc = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE, cwd=dest)
-    treeid = proc.communicate(input=b'')[0].decode('utf-8').rstrip("\n")
-    proc.wait()
+    (code, out, errout) = run(args, cwd=dest, input=b'')
+    treeid = out.decode('utf-8').rstrip("\n")
 
-    if proc.returncode != 0:
+    if code != 0:
         return False
 
     # ... | xargs git commit-tree
     args = [git_executable, "commit-tree", treeid]
-    proc = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE, cwd=dest)
-    commid = proc.communicate(input=b'')[0].decode('utf-8').rstrip("\n")
-    proc.wait()
+    (code, out, errout) = run(args, cwd=dest, input=b'')
+    commid = out.decode('utf-8').rstrip("\n")
 
-    if proc.returncode != 0:
+    if code != 0:
         return False
 
     # ... | xargs git branch $name
     args = [git_executable, "branch", name, commid]
-    proc = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE, cwd=dest)
-    res = proc.communicate(input=b'')[0].decode('utf-8').rstrip("\n")
-    proc.wait()
+    (code, out, errout) = run(args, cwd=dest, input=b'')
 
-    return proc.returncode == 0
+    return code == 0
 
 
 def origin(dir="."):
@@ -215,7 +426,4 @@ def origin(dir="."):
     Finds the origin of a given git repository. 
     """
 
-    return subprocess.Popen([git_executable, "remote", "show", "origin", "-n"],
-                                                    stdout=subprocess.PIPE,
-                                                    cwd=dir,
-                                                    ).communicate()[0]
+    return run([git_executable, "remote", "show", "origin", "-n"], cwd=dir, stderr=None)[1]
@@ -7,6 +7,7 @@ import os
 import os.path
 import shutil
 import getpass
+import threading
 
 from subprocess import Popen, PIPE
 
@@ -53,6 +54,68 @@ __supressStd__ = False
 __supressErr__ = False
 __supressIn__ = False
 
+# Per-thread output buffers
+__buffers__ = threading.local()
+
+def start_buffer():
+    """
+    Starts buffering all output of std() and err() made from the current thread
+    """
+
+    __buffers__.data = []
+
+def is_buffered():
+    """
+    Checks if the output of the current thread is being buffered
+    """
+
+    return getattr(__buffers__, "data", None) != None
+
+def end_buffer():
+    """
+    Stops buffering output of the current thread and returns the buffered output
+    """
+
+    data = getattr(__buffers__, "data", None) or []
+    __buffers__.data = None
+    return data
+
+def write_buffer(data):
+    """
+    Writes output previously returned by end_buffer()
+    """
+
+    for (stderr, text) in data:
+        write_out(text, stderr)
+
+def buffered(f):
+    """
+    Wraps a function so that its output is buffered. The wrapped function
+    returns a tuple of the result and the output.
+    """
+
+    def wrapper(*args, **kwargs):
+        start_buffer()
+        try:
+            res = f(*args, **kwargs)
+        finally:
+            output = end_buffer()
+        return (res, output)
+
+    return wrapper
+
+def write_out(text, stderr = False):
+    """
+    Writes raw text to stdout (or stderr) or the buffer of the current thread
+    """
+
+    if is_buffered():
+        __buffers__.data.append((stderr, text))
+    elif stderr:
+        sys.stderr.write(text)
+    else:
+        sys.stdout.write(text)
+
 def std(*args, **kwargs):
     """
     Prints text to stderr. Supports keyword argument newline (to add or not add
@@ -71,7 +134,7 @@ def std(*args, **kwargs):
     text = " ".join([str(text) for text in args]) + ('\n' if newline else '')
 
     if not __supressStd__:
-        sys.stdout.write(text)
+        write_out(text)
 
 def err(*args, **kwargs):
     """
@@ -99,17 +162,15 @@ def err(*args, **kwargs):
     if not __supressErr__:
         text = " ".join([str(text) for text in args]) + ('\n' if newline else '')
         if colors:
-            sys.stderr.write(term_colors("red")+text+term_colors("normal"))
+            write_out(term_colors("red")+text+term_colors("normal"), True)
         else:
-            sys.stderr.write(text)
+            write_out(text, True)
 
 def std_paged(*args, **kwargs):
     """
     Pages output if a pager is available.
     """
 
-    from lmh.lib.config import get_config
-
     newline = True
 
     # allow only the newline kwarg
@@ -119,19 +180,59 @@ def std_paged(*args, **kwargs):
         else:
             newline = kwargs["newline"]
 
-    if not __supressStd__:
-        pager = get_config("env::pager")
+    std_paged_iter([" ".join([str(text) for text in args]) + ('\n' if newline else '')])
 
-        if pager == "":
-            return std(*args, **kwargs)
-        try:
-            p = Popen([pager], stdout=sys.stdout, stderr=sys.stderr, stdin=PIPE)
-            p.communicate(" ".join([str(text) for text in args]) + ('\n' if newline else ''))
-        except:
-            err("Unable to run configured page. ")
-            err("Please check your value for env::pager. ")
-            err("Falling back to STDOUT. ")
-            return std(*args, **kwargs)
+def std_paged_iter(chunks):
+    """
+    Pages output given as an iterable of strings if a pager is available.
+    Each chunk is written as soon as it is produced.
+    """
+
+    from lmh.lib.config import get_config
+
+    if __supressStd__:
+        return
+
+    pager = get_config("env::pager")
+
+    if pager == "":
+        for chunk in chunks:
+            std(chunk, newline=False)
+        return
+
+    try:
+        p = Popen([pager], stdout=sys.stdout, stderr=sys.stderr, stdin=PIPE, universal_newlines=True)
+    except:
+        err("Unable to run configured page. ")
+        err("Please check your value for env::pager. ")
+        err("Falling back to STDOUT. ")
+        for chunk in chunks:
+            std(chunk, newline=False)
+        return
+
+    try:
+        for chunk in chunks:
+            p.stdin.write(chunk)
+        p.stdin.close()
+    except BrokenPipeError:
+        # the pager was closed before we were done.
+        pass
+
+    p.wait()
+
+def std_summary(states, colors):
+    """
+    Prints a summary of per-repository states.
+
+    @param states - List of tuples (repository, state).
+    @param colors - Dictionary mapping each state to a color.
+    """
+
+    std("---")
+    std("Summary:")
+    for (rep, state) in states:
+        std("   "+term_colors(colors[state])+state.ljust(12)+term_colors("normal"), rep)
+    std("---")
 
 
 def read_raw(query = None, hidden = False):
@@ -224,21 +325,70 @@ def copytree(src, dst, symlinks=False, ignore=None):
         else:
             shutil.copy2(s, d)
 
-def find_files(directory, *ext):
+"""Names of directories that are never searched for files. """
+prune_dirs = frozenset([".git"])
+
+def walk_files(directory, *ext, prune = prune_dirs):
+    """
+    Lazily yields all files in a directory recursively, in a stable order.
+    Does not descend into directories named in prune or into nested git
+    repositories (such as installed generated branches). Symbolic links to
+    directories are followed, but each directory is only visited once.
+
+    @param directory - Directory to search.
+    @param ext - If given, only yield files with one of these extensions.
+    @param prune - Names of directories to skip.
+    """
+
+    exts = frozenset(["."+e for e in ext])
+    stack = [directory]
+
+    # (device, inode) of all directories seen, so that links can not loop.
+    visited = set()
+
+    while len(stack) > 0:
+        root = stack.pop()
+
+        try:
+            st = os.stat(root)
+            if (st.st_dev, st.st_ino) in visited:
+                continue
+            visited.add((st.st_dev, st.st_ino))
+
+            entries = sorted(os.scandir(root), key=lambda e:e.name)
+        except OSError:
+            continue
+
+        # a nested repository has its own files.
+        if root != directory and any([e.name == ".git" for e in entries]):
+            continue
+
+        dirs = []
+        for e in entries:
+            try:
+                if e.is_dir():
+                    if not e.name in prune:
+                        dirs.append(e.path)
+                elif e.is_file() and (len(exts) == 0 or os.path.splitext(e.name)[1] in exts):
+                    yield e.path
+            except OSError:
+                pass
+
+        stack.extend(reversed(dirs))
+
+def find_files(directory, *ext, prune = prune_dirs):
     """
-    Finds all files with given extensions i a given direcory recursively
+    Finds all files with given extensions in a given directory recursively.
+    Returns a tuple with one list of files per extension.
     """
-    res = []
 
-    ext = ["."+e for e in ext]
-    res = [[] for e in ext]
+    index = dict([("."+e, i) for (i, e) in enumerate(ext)])
+    res = tuple([[] for e in ext])
+
+    for file in walk_files(directory, *ext, prune=prune):
+        res[index[os.path.splitext(file)[1]]].append(file)
 
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            for (i, e) in enumerate(ext):
-                if file.endswith(e):
-                    res[i].append(os.path.join(root, file))
-    return tuple(res)
+    return res
 
 
 #
@@ -2,9 +2,9 @@ import os
 import os.path
 import re
 import glob
+import itertools
 
-from lmh.lib.utils import reduce
-from lmh.lib.io import std, err, read_file
+from lmh.lib.io import std, err, read_file, walk_files, prune_dirs
 from lmh.lib.dirs import lmh_locate
 from lmh.lib.repos.local.dirs import find_repo_dir, find_repo_subdirs
 
@@ -18,6 +18,9 @@ folder_exclude_list = ["tikz"]
 # really ugly workaround for #223
 folder_exclude_list = ["tikz"]
 
+# Directories not to search for modules.
+module_prune_dirs = prune_dirs.union(folder_exclude_list)
+
 def needsPreamble(file):
     """
         Checks if a file needs a preamble.
@@ -38,9 +41,6 @@ def locate_files(path):
     if path.startswith(os.path.abspath(lmh_locate())) and not path.startswith(os.path.abspath(lmh_locate("content"))):
         return []
 
-    # fill these modules.
-    modules = []
-
     # Make sure we are inside the source directory.
     if os.path.relpath(lmh_locate("content"), path) == "../..":
         path = path + "/source"
@@ -57,20 +57,8 @@ def locate_files(path):
     if not os.path.isdir(path):
         return []
 
-    # find all files and folders.
-    objects = [os.path.abspath(path + "/" + f) for f in os.listdir(path)]
-    files = filter(lambda f:os.path.isfile(f), objects)
-    folders = filter(lambda f:os.path.isdir(f), objects)
-
-    # HACK out the tikz directories.
-    folders = filter(lambda f:not f.split("/")[-1] in folder_exclude_list, folders)
-    modules = reduce([os.path.abspath(file) for file in files])
-
-    # and go into subdirectories.
-    modules.extend(reduce([locate_files(folder) for folder in folders]))
-
-    # return the modules.
-    return modules
+    # find all files, but HACK out the tikz directories.
+    return list(walk_files(path, prune=module_prune_dirs))
 
 def locate_compile_target(path, try_root= True):
     """
@@ -91,7 +79,7 @@ def locate_compile_target(path, try_root= True):
     if relpath == "../..":
         path = path + "/source"
     elif not relpath.endswith("../.."):
-        return reduce([(locate_compile_target(p)) for p in find_repo_subdirs(path)])
+        return list(itertools.chain.from_iterable([locate_compile_target(p) for p in find_repo_subdirs(path)]))
     # Get the absolute path.
     path = os.path.realpath(path)
 
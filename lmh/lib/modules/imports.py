@@ -0,0 +1,91 @@
+import re
+
+from lmh.lib.io import read_file
+
+# Macros importing modules from other repositories.
+mh_macros = ["usemhvocab", "usemhmodule", "adoptmhmodule", "importmhmodule"]
+path_macros = ["usemodule", "adoptmodule", "importmodule", "usevocab"]
+g_macros = ["gimport", "guse", "gadopt", "gadpot"]
+
+# Macros that can also import modules from the same repository.
+local_macros = g_macros + mh_macros
+
+# One pattern for all import forms. It is wrapped in a lookahead, so that
+# matches may overlap (e.g. \MathHub{} inside the argument of \usemodule)
+# just like with separate patterns. Arguments never span lines.
+import_pattern = re.compile(r"(?=\\(?:" +
+    r"(?P<mh>" + "|".join(mh_macros) + r")\[(?:[^\]\n]*,)?repos=(?P<mh_repo>[^,\]\n]+)[^\S\n]*(?:,[^\]\n]*)?\](?:\{(?P<mh_module>[^\}\n]*)\})?" +
+    r"|(?P<path>" + "|".join(path_macros) + r")\[(?P<path_path>[^\]\n]+)\]" +
+    r"|(?P<mathhub>MathHub)\{(?P<mathhub_path>[^\}\n]+)\}" +
+    r"|(?P<g>" + "|".join(g_macros) + r")\[(?P<g_repo>[^\]\n]+)\](?:\{(?P<g_module>[^\}\n]*)\})?" +
+    r"|(?P<local>" + "|".join(local_macros) + r")\{(?P<local_module>[^\}\n]+)\}" +
+r"))")
+
+def repo_of(path):
+    """
+        Returns the repository a path starts with or None if it has less than
+        two components or contains other macros.
+    """
+
+    comps = path.split("/")
+    if len(comps) < 2 or "\\" in path:
+        return None
+    return comps[0]+"/"+comps[1]
+
+def find_imports(text):
+    """
+        Finds all imports in a piece of text in a single pass.
+
+        @param text {string} Text to search.
+
+        @returns {dict[]} One record per import with the keys macro, target
+            (the repository or path as it is written or None for imports
+            from the same repository), repo (the repository the target
+            refers to or None), module (the imported module or
+            None if not given) and line (1-based line number).
+    """
+
+    # most of the text has no macros at all.
+    if not "\\" in text:
+        return []
+
+    res = []
+
+    # count lines incrementally, matches come in order.
+    (line, pos) = (1, 0)
+
+    for m in import_pattern.finditer(text):
+        if m.group("mh"):
+            (macro, target, module) = (m.group("mh"), m.group("mh_repo"), m.group("mh_module"))
+        elif m.group("path"):
+            (macro, target, module) = (m.group("path"), m.group("path_path"), None)
+        elif m.group("mathhub"):
+            (macro, target, module) = (m.group("mathhub"), m.group("mathhub_path"), None)
+        elif m.group("g"):
+            (macro, target, module) = (m.group("g"), m.group("g_repo"), m.group("g_module"))
+        else:
+            (macro, target, module) = (m.group("local"), None, m.group("local_module"))
+
+        line += text.count("\n", pos, m.start())
+        pos = m.start()
+
+        res.append({
+            "macro": macro,
+            "target": target,
+            "repo": None if target == None else repo_of(target),
+            "module": module,
+            "line": line
+        })
+
+    return res
+
+def find_file_imports(file):
+    """
+        Finds all imports in a file. See find_imports.
+
+        @param file {string} File to read.
+
+        @returns {dict[]}
+    """
+
+    return find_imports(read_file(file))
@@ -1,17 +1,22 @@
 import os
+import re
 import glob
 import json
 import shutil
 
-from lmh.lib.utils import reduce
-from lmh.lib.io import find_files, std, err
+from lmh.lib.io import std, err
 from lmh.lib.dirs import lmh_locate
 
-from lmh.lib.repos.local import match_repo, match_repos, calc_deps
+from lmh.lib.repos.local import match_repo, calc_deps
+from lmh.lib.repos.local.importers import find_importers
 from lmh.lib.repos.find_and_replace import find_cached
+from lmh.lib.batch import WriteBatch
 
-def movemod(source, dest, modules, no_depcrawl, simulate = False):
-    """Moves modules from source to dest. """
+def movemod(source, dest, modules, no_depcrawl, simulate = False, dry_run = False):
+    """
+        Moves modules from source to dest. With dry_run no files are moved and
+        the changes to the moved and importing files are shown as a diff.
+    """
 
     # change directory to MathHub root, makes paths easier
     if simulate:
@@ -22,6 +27,10 @@ def movemod(source, dest, modules, no_depcrawl, simulate = False):
     finds = []
     replaces = []
 
+    # patterns for imports without a repository, only valid in the source.
+    source_finds = []
+    source_replaces = []
+
     # Match the repos
     source = match_repo(source, root=lmh_locate("content"))
     dest = match_repo(dest, root=lmh_locate("content"))
@@ -56,6 +65,10 @@ def movemod(source, dest, modules, no_depcrawl, simulate = False):
             local_finds.append(find)
             local_replaces.append(replace)
 
+    # Local imports in the moved files now point to the source repository,
+    # unless they import modules that are moved as well.
+    run_lmh_find_moved(r"\\("+"|".join(["gimport", "guse", "gadopt"])+")\{(((?!(?<=\{)("+"|".join(modules)+")\}).)*?)\}", "\\$g0["+osource+"]{$g1}")
+
     for module in modules:
 
         dest = odest
@@ -73,7 +86,8 @@ def movemod(source, dest, modules, no_depcrawl, simulate = False):
         oldcall_long = "\[(.*)repos=" + srcapath + "(.*)\]\{"+srcbpath+"\}"
         oldcall_local = "\{"+srcbpath+ "\}"
         newcall = "[" + dest + "]{"+srcbpath+"}"
-        newcall_long = "[$g1" + dest + "$g2]{"+srcbpath+"}"
+        newcall_long = "[${g1}repos=" + dest + "${g2}]{"+srcbpath+"}"
+        newcall_long_local = "[repos=" + dest + "]{"+srcbpath+"}"
 
         dest += "/source/"
 
@@ -81,6 +95,12 @@ def movemod(source, dest, modules, no_depcrawl, simulate = False):
         if simulate:
             std("mv "+srcpath + ".*.tex"+ " "+ dest + " 2>/dev/null || true")
             std("mv "+srcpath + ".tex"+ " "+ dest + " 2>/dev/null || true")
+        elif dry_run:
+            # leave them where they are, but update them anyways.
+            for pat in [srcpath + ".tex"] + glob.glob(srcpath + ".*.tex"):
+                if os.path.isfile(pat):
+                    std("Would move", pat, "to", dest)
+                    moved_files.append(os.path.abspath(pat))
         else:
             try:
                 shutil.move(srcpath + ".tex", dest)
@@ -101,48 +121,61 @@ def movemod(source, dest, modules, no_depcrawl, simulate = False):
             finds.append(find)
             replaces.append(replace)
 
+        def run_lmh_find_source(find, replace):
+            source_finds.append(find)
+            source_replaces.append(replace)
+
         # Run all the commands
         m = "("+"|".join(["gimport", "guse", "gadopt"])+")"
         run_lmh_find(r'\\'+m+oldcall, '\\$g0'+newcall)
-        run_lmh_find(r'\\'+m+oldcall_local, '\\$g0'+newcall)
+        run_lmh_find_source(r'\\'+m+oldcall_local, '\\$g0'+newcall)
 
         m = "("+ "|".join(["importmhmodule", "usemhmodule", "adoptmhmodule", "usemhvocab"]) + ")"
         run_lmh_find(r'\\'+m+oldcall_long, '\\$g0'+newcall_long)
-        run_lmh_find(r'\\'+m+oldcall_local, '\\$g0'+newcall_long)
+        run_lmh_find_source(r'\\'+m+oldcall_local, '\\$g0'+newcall_long_local)
 
         # For the moved files, repalce gimport, guse, gadpot
-        run_lmh_find_moved(r"\\("+"|".join(["gimport", "guse", "gadopt"])+")\["+dest[-len("/source/")]+"\]\{(.*)\}", "\\$g1{$g2}")
-
-    # Update the moved files.
-    run_lmh_find_moved(r"\\("+"|".join(["gimport", "guse", "gadopt"])+")\{(((?!(?<=\{)("+"|".join(modules)+")\}).)*?)\}", "\\$g1{$g2}")
+        run_lmh_find_moved(r"\\("+"|".join(["gimport", "guse", "gadopt"])+")\["+re.escape(odest)+"\]\{(.*?)\}", "\\$g0{$g1}")
 
     # Make the repo paths absolute
     osource = match_repo(osource, abs=True)
     odest = match_repo(odest, abs=True)
 
-    files = reduce([find_files(r, "tex")[0] for r in match_repos(lmh_locate("content"), abs=True)])
-
     if simulate:
         for (f, r) in zip(finds, replaces):
             std("lmh find", json.dumps(f), "--replace", json.dumps(r), "--apply")
+        for (f, r) in zip(source_finds, source_replaces):
+            std("lmh find", json.dumps(f), "--replace", json.dumps(r), "--apply", osource)
 
         if not no_depcrawl:
-            calc_deps(False, dirname=osource)
-            calc_deps(False, dirname=odest)
+            std("lmh depcrawl", osource, odest, "--apply")
 
         return True
 
     else:
+        # Only look at files that import one of the moved modules.
+        stats = {"hits": 0, "misses": 0}
+        files = find_importers(source, modules, stats)
+        source_files = [f for f in files if f.startswith(osource + os.sep)]
+
         std("updating paths in the following files: ")
 
-        res1 = find_cached(files, finds, replace=replaces)
-        res2 = find_cached(moved_files, local_finds, replace=local_replaces)
+        # Write all the changes at once, so that they are not half-applied.
+        batch = WriteBatch(dry_run)
 
-        if not no_depcrawl:
-            res3 = calc_deps(True, osource)
-            res4 = calc_deps(True, odest)
-        else:
-            res3 = True
-            res4 = True
+        find_cached(files, finds, replace=replaces, batch=batch)
+        find_cached(source_files, source_finds, replace=source_replaces, batch=batch)
+        find_cached(moved_files, local_finds, replace=local_replaces, batch=batch)
+
+        changed = len(batch.changed())
+
+        if not batch.commit():
+            return False
 
-        return res1 and res2 and res3 and res4
+        searched = len(set(files).union([os.path.abspath(f) for f in moved_files]))
+        std("Searched", searched, "of", stats["hits"] + stats["misses"], "files ("+str(stats["misses"]), "read to update the import index),", changed, "changed. ")
+
+        if not no_depcrawl and not dry_run:
+            calc_deps([osource, odest], apply=True)
+
+        return True
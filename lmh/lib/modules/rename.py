@@ -2,7 +2,8 @@ import os
 import re
 import os.path
 
-from lmh.lib.io import std, err, find_files, read_file, write_file
+from lmh.lib.io import std, err, walk_files, read_file
+from lmh.lib.batch import WriteBatch
 
 def rename(where, renamings, simulate = False):
     """Moves modules from source to dest. """
@@ -42,7 +43,7 @@ def rename(where, renamings, simulate = False):
 
         # defi
         regexes.append(re.compile(r"\\def"+find_i+r"\["+find+r"\]"+find_args))
-        replaces.append("\\def"+replace_i+"["+replace+"]"+replace_args)
+        replaces.append("\\\\def"+replace_i+"["+replace+"]"+replace_args)
 
         # defi (Michael)
         regexes.append(re.compile(r"(\\def(?:i{1,3}))\["+find+r"\](\{(?:[^\}]*)\})"))
@@ -58,22 +59,26 @@ def rename(where, renamings, simulate = False):
 
         # mtrefi
         regexes.append(re.compile(r"\\mtref"+find_i+r"\[([^\]\?]*)\?"+find+r"\]"+find_args))
-        replaces.append("\\mtref"+replace_i+"[\\1?"+replace+"]"+replace_args)
+        replaces.append("\\\\mtref"+replace_i+"[\\1?"+replace+"]"+replace_args)
 
         # go to the next pattern.
         i = i+2
 
-    actions = zip(regexes, replaces)
+    actions = list(zip(regexes, replaces))
+
+    # Only write files that changed, all at once at the end.
+    batch = WriteBatch(dry_run=simulate)
 
     # Find all the files
-    for file in find_files(where, "tex")[0]:
+    for file in walk_files(where, "tex"):
         # Read a file
-        content = read_file(file)
+        old = read_file(file)
+        content = old
 
         # Run all of the actions
         for (f, r) in actions:
             content = f.sub(r, content)
 
-        write_file(file, content)
+        batch.write(file, content, old)
 
-    return True
+    return batch.commit()
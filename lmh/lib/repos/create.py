@@ -5,11 +5,12 @@ from string import Template
 
 from lmh.lib.utils import mkdir_p
 from lmh.lib.dirs import lmh_locate
-from lmh.lib.io import read_file, write_file, find_files, std, err, read_raw
+from lmh.lib.io import read_file, write_file, walk_files, std, err, read_raw
 from lmh.lib.config import get_config
 from lmh.lib.repos.local import match_repo
 from lmh.lib.repos.indexer import find_source
 from lmh.lib.repos.local.package import is_installed
+from lmh.lib.repos.local.registry import register_repo
 
 # Git stuffs
 from lmh.lib.git import do as git_do
@@ -47,7 +48,7 @@ def copy_template_dir(source, destination, vars):
         distutils.dir_util.copy_tree(source, destination)
 
         # Find all the template files
-        for f in find_files(destination, "tpl")[0]:
+        for f in list(walk_files(destination, "tpl")):
             # Substitute everything in the template
             newcontent = Template(read_file(f)).safe_substitute(vars)
             write_file(f[:-len(".tpl")], newcontent)
@@ -210,6 +211,8 @@ def create(reponame, type="none", remote = True):
             err("Please run it manually. ")
             return False
 
+    register_repo(repo)
+
     # Create the initial commit.
     if not (git_do(absrepo, "add", "-A") and git_commit(absrepo, "-m", "Repository created by lmh")):
         err("Error creating inital commit. ")
@@ -1,37 +1,97 @@
 import os
 import re
+import itertools
 from string import Template
 
 from lmh.lib.io import is_string
-from lmh.lib.io import find_files, std, err, read_file, write_file
+from lmh.lib.io import walk_files, std, err, read_file
+from lmh.lib.batch import WriteBatch
 from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import process_map, chunks
 from lmh.lib.repos.local import find_repo_dir, match_repo
+from lmh.lib.repos.index import index_candidates, pattern_literals
 
-def find_and_replace_file(file, match, replace, replace_match = None):
-    """Finds and replaces a single file. """
+"""Number of files each worker searches at once. """
+files_per_task = 32
+
+# Compiled patterns and prefilters of this process, by repository and patterns.
+__patterns__ = {}
+__prefilters__ = {}
+
+def file_repo(file):
+    """Returns the name of the repository a file belongs to. """
+
+    rel = os.path.relpath(file, lmh_locate("content")).split(os.sep)
+
+    if len(rel) > 2 and rel[0] != "..":
+        return rel[0]+"/"+rel[1]
+
+    return os.path.relpath(find_repo_dir(file), lmh_locate("content"))
+
+def compile_patterns(repo, match):
+    """
+        Compiles patterns for files in a repository. $repo in the patterns
+        is replaced with the name of the repository. Each set of patterns is
+        only compiled once per repository.
+    """
+
+    key = (repo, tuple(match))
+
+    if not key in __patterns__:
+        __patterns__[key] = [re.compile(Template(m).substitute(repo=repo)) for m in match]
+
+    return __patterns__[key]
+
+def compile_prefilter(repo, match):
+    """
+        Compiles a prefilter for patterns in a repository. Returns a tuple
+        (literals, any). literals contains for each pattern the longest piece
+        of text all of its matches contain, or None if there is none. any is
+        a single regular expression finding any of them, or None if some
+        pattern has no such text.
+    """
+
+    key = (repo, tuple(match))
+
+    if not key in __prefilters__:
+        literals = []
+        for m in match:
+            lits = pattern_literals(Template(m).substitute(repo=repo))
+            literals.append(max(lits, key=len) if len(lits) > 0 else None)
+
+        if len(literals) == 0 or None in literals:
+            any_literal = None
+        else:
+            any_literal = re.compile("|".join([re.escape(l) for l in sorted(set(literals), key=len, reverse=True)]))
+
+        __prefilters__[key] = (literals, any_literal)
+
+    return __prefilters__[key]
+
+def may_match(content, prefilter):
+    """
+        Checks if any of the patterns of a prefilter might match.
+    """
+
+    (literals, any_literal) = prefilter
+    return any_literal == None or any_literal.search(content) != None
+
+def find_and_replace_file(file, match, replace, replace_match = None, prefilter = None, batch = None):
+    """
+        Finds and replaces a single file, given compiled patterns. Patterns
+        whose literal text (from the prefilter) does not occur are skipped.
+        Changes are staged in batch or written immediately if it is None.
+    """
 
     if len(match) != len(replace):
         err("Find and Replace patterns are not of the same length. ")
         return False
 
-    # Compile thex regexp
-    try:
-        match_regex = [re.compile(m) for m in match]
-    except Exception as e:
-        err(e)
-        err("Unable to compile regular expressions. ")
-        return False
-
     # get the repository
-    repo = os.path.relpath(find_repo_dir(file), lmh_locate("content"))
+    repo = file_repo(file)
 
-    # We did nothing yet
-    did = False
     if replace_match == None:
         def replace_match(match, replace):
-            # TODO: Migrate this to the parent scope.
-            # did = True
-
             # Make a template,
             replacer_template = {}
             replacer_template["repo"] = repo
@@ -41,50 +101,78 @@ def find_and_replace_file(file, match, replace, replace_match = None):
             # And replace in it
             return Template(replace).substitute(replacer_template)
 
-    # Read file and search
-    file_content = read_file(file)
-    new_file_content = file_content
-
-    # Iterate over the regexes and replace
-    for (m, r) in zip(match_regex, replace):
-        new_file_content = re.sub(m, lambda x:replace_match(x, r), new_file_content)
-
-    if file_content != new_file_content:
-        std(file)
-        # If something has changed, write back the file.
-        write_file(file, new_file_content)
-    if did:
-        std(file)
-    return did
+    if prefilter == None:
+        prefilter = ([None for m in match], None)
 
-def find_file(file, match):
-    """Finds inside a single file. """
-
-    # Compile thex regexp
-    try:
-        match_regex = [re.compile(m) for m in match]
-    except Exception as e:
-        err(e)
-        err("Unable to compile regular expressions. ")
-        return False
+    if batch == None:
+        batch = WriteBatch()
+        return find_and_replace_file(file, match, replace, replace_match, prefilter, batch) and batch.commit()
 
     # Read file and search
-    file_content = read_file(file)
+    file_content = batch.read(file)
+    new_file_content = file_content
 
-    ret = False
-    for i, m in enumerate(match_regex):
-        if re.search(m, file_content) != None:
-            if len(match) > 1:
-                std(str(i), file)
-            else:
-                std(file)
-            ret = True
+    # Skip files where no pattern can match
+    if not may_match(file_content, prefilter):
+        return False
 
-    return ret
+    # Iterate over the regexes and replace. Earlier replacements may
+    # introduce text for later patterns, so check the current content.
+    for (m, r, l) in zip(match, replace, prefilter[0]):
+        if l == None or l in new_file_content:
+            new_file_content = m.sub(lambda x:replace_match(x, r), new_file_content)
 
+    if file_content == new_file_content:
+        return False
 
-def find_cached(files, match, replace = None, replace_match = None):
-    """Finds and replaces inside of files. """
+    # If something has changed, write back the file.
+    std(file)
+    batch.write(file, new_file_content, file_content)
+    return True
+
+def search_file(file, regexes, prefilter):
+    """
+        Searches a single file. Returns a sorted list of tuples (line, match)
+        for all matches of all regexes.
+    """
+
+    content = read_file(file)
+
+    if not may_match(content, prefilter):
+        return []
+
+    res = []
+    for (r, l) in zip(regexes, prefilter[0]):
+        if l != None and not l in content:
+            continue
+
+        (line, pos) = (1, 0)
+        for m in r.finditer(content):
+            line += content.count("\n", pos, m.start())
+            pos = m.start()
+            res.append((line, m.group(0)))
+
+    return sorted(res)
+
+def search_files(task):
+    """
+        Searches some files for patterns. Runs in a worker process and
+        returns a list of tuples (file, matches).
+    """
+
+    (match, files) = task
+    res = []
+    for f in files:
+        repo = file_repo(f)
+        res.append((f, search_file(f, compile_patterns(repo, match), compile_prefilter(repo, match))))
+    return res
+
+def find_cached(files, match, replace = None, replace_match = None, jobs = None, batch = None, dry_run = False):
+    """
+        Finds and replaces inside of files. Replacements are staged in batch
+        if given, otherwise they are written all at once at the end (or shown
+        as a diff if dry_run is set).
+    """
 
     # Make sure match and replace are arrays
     match = [match] if is_string(match) else match
@@ -95,24 +183,57 @@ def find_cached(files, match, replace = None, replace_match = None):
             err("Find and Replace patterns are not of the same length. ")
             return False
 
+    # Make sure all patterns compile
+    try:
+        compile_patterns("", match)
+    except Exception as e:
+        err(e)
+        err("Unable to compile regular expressions. ")
+        return False
 
     rep = False
-    for file in files:
-        repo = os.path.relpath(find_repo_dir(file), lmh_locate("content"))
-        matcher = [Template(m).substitute(repo=repo) for m in match]
-        if replace != None:
-            rep = find_and_replace_file(file, matcher, replace, replace_match = replace_match) or rep
-        else:
-            rep = find_file(file, matcher) or rep
+
+    if replace != None:
+        own_batch = batch == None
+        if own_batch:
+            batch = WriteBatch(dry_run)
+
+        for file in files:
+            repo = file_repo(file)
+            rep = find_and_replace_file(file, compile_patterns(repo, match), replace, replace_match = replace_match, prefilter = compile_prefilter(repo, match), batch = batch) or rep
+
+        if own_batch:
+            return batch.commit() and rep
+        return rep
+
+    # Search in parallel and print results in order.
+    tasks = ((match, c) for c in chunks(files, files_per_task))
+
+    for results in process_map(search_files, tasks, jobs):
+        for (file, matches) in results:
+            for (line, m) in matches:
+                std(file+":"+str(line)+":"+m.replace("\n", "\\n"))
+                rep = True
+
     return rep
 
-def find(rep, args):
-    """Finds pattern in repositories"""
+def find_repo_files(rep, match, use_index = True):
+    """
+        Finds the files in a repository that need to be searched. Uses the
+        index of the repository if it has one.
+    """
 
-    match = args.matcher
-    replace = args.replace[0] if args.apply else None
+    if use_index:
+        files = index_candidates(match_repo(rep), [match] if is_string(match) else match)
+        if files != None:
+            return files
+
+    return walk_files(match_repo(rep, abs=True), "tex")
+
+def find(repos, match, replace = None, jobs = None, use_index = True, dry_run = False):
+    """Finds pattern in repositories"""
 
-    # Find files in the repository
-    files = find_files(match_repo(rep, abs=True), "tex")[0]
+    # Find files in all the repositories
+    files = itertools.chain.from_iterable(find_repo_files(rep, match, use_index) for rep in repos)
 
-    return find_cached(files, match, replace)
+    return find_cached(files, match, replace, jobs = jobs, dry_run = dry_run)
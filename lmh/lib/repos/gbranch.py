@@ -231,8 +231,8 @@ class Generated:
             if not do(rpath, "branch", branch, "--track", "origin/"+branch):
                 return False
 
-        # Clone it shared
-        if not do(rpath, "clone", rpath, dpath, "--shared", "-b", branch):
+        # Clone it shared, but only check it out once origin is set up.
+        if not do(rpath, "clone", rpath, dpath, "--shared", "--no-checkout", "-b", branch):
             return False
 
         # set up .git/objects/info/alternates relatively
@@ -243,6 +243,24 @@ class Generated:
         if not do(dpath, "remote", "set-url", "origin", o.rstrip("\n")):
             return False
 
+        # If the repository is a partial clone the blobs of the branch are
+        # missing, so fetch them from origin when they are needed.
+        (clone_filter, e) = do_data(rpath, "config", "--local", "--get", "remote.origin.partialclonefilter")
+        clone_filter = clone_filter.strip()
+
+        if clone_filter != "":
+            for (key, value) in [
+                ("core.repositoryformatversion", "1"),
+                ("extensions.partialClone", "origin"),
+                ("remote.origin.promisor", "true"),
+                ("remote.origin.partialclonefilter", clone_filter)
+            ]:
+                if not do(dpath, "config", "--local", key, value):
+                    return False
+
+        if not do(dpath, "checkout", "--force", branch):
+            return False
+
         return do(rpath, "branch", "-D", branch)
 
 
@@ -1,8 +1,15 @@
-from lmh.lib.io import std, err, term_colors
+import os.path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from lmh.lib.io import std, err, term_colors, start_buffer, end_buffer, write_buffer
 from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import default_jobs, mkdir_p
+from lmh.lib.config import get_config
 from lmh.lib.git import clone
 from lmh.lib.repos.local.package import get_package_dependencies, is_installed
 from lmh.lib.repos.indexer import find_source
+from lmh.lib.repos.git.objects import object_cache_args
+from lmh.lib.repos.local.registry import register_repo
 
 from lmh.lib.repos.git.hooks import hook_pre_install, hook_post_install
 
@@ -31,7 +38,29 @@ def do_deps_install(rep):
 
     return (True, deps)
 
-def do_install(rep):
+def clone_args(shallow = False):
+    """
+        Returns additional arguments for git clone as configured by
+        install::clone_depth and install::clone_filter.
+    """
+
+    args = []
+
+    depth = get_config("install::clone_depth")
+    if shallow and depth == 0:
+        depth = 1
+
+    # Fetch all branches, we still need the generated ones.
+    if depth > 0:
+        args.extend(["--depth", str(depth), "--no-single-branch"])
+
+    clone_filter = get_config("install::clone_filter")
+    if clone_filter != "":
+        args.append("--filter="+clone_filter)
+
+    return args
+
+def do_install(rep, shallow = False):
     """
         Installs a single repository.
     """
@@ -56,8 +85,14 @@ def do_install(rep):
 
     std("   OK, will clone from '"+repoURL+"'")
 
+    # Make sure the group directory exists, other clones might create it at the same time.
+    mkdir_p(os.path.dirname(lmh_locate("content", rep)))
+
     # Clone the repository.
-    if not clone(lmh_locate("content"), repoURL, rep):
+    args = clone_args(shallow)
+    args += object_cache_args(rep, repoURL, partial = len(args) > 0)
+
+    if not clone(lmh_locate("content"), repoURL, rep, *args):
         err("git clone did not exit cleanly, cloning failed. ")
         err("""
 Most likely your network connection is bad.
@@ -67,6 +102,8 @@ If you are using localmh_docker make sure that you have internet access inside t
 
     std("   OK. ")
 
+    register_repo(rep)
+
     # post-installation hook.
     std("Running post-installation hook for '"+rep+"' ... ", newline=False)
 
@@ -78,24 +115,23 @@ If you are using localmh_docker make sure that you have internet access inside t
     # Check for dependencies.
     return do_deps_install(rep)
 
-def install(*reps):
-    """Install a repositories and its dependencies"""
-
-    ret = True
+def install_single(rep, shallow = False):
+    """
+        Installs or re-scans a single repository and returns a tuple
+        (success, dependencies, output) with the buffered output.
+    """
 
-    reps = list(filter(lambda x:x, [r.strip() for r in reps]))
+    start_buffer()
 
-    for rep in reps:
+    try:
         if not is_installed(rep):
             std("Starting installation:         ", term_colors("blue")+"'"+rep+"'"+term_colors("normal"))
-            (res, deps) = do_install(rep)
+            (res, deps) = do_install(rep, shallow)
 
             if not res:
                 err("Failed installation:           ", term_colors("red")+"'"+rep+"'"+term_colors("normal"))
-                ret = False
             else:
                 std("Finished installation:         ", term_colors("green")+"'"+rep+"'"+term_colors("normal"))
-                reps.extend([d for d in deps if not d in reps])
         else:
             std("Re-scanning for dependencies: ", term_colors("blue")+"'"+rep+"'"+term_colors("normal"))
 
@@ -103,7 +139,52 @@ def install(*reps):
 
             if not res:
                 err("Failed scan:                  ", term_colors("red")+"'"+rep+"'"+term_colors("normal"))
+                # a failed scan does not fail the installation
+                res = True
             else:
                 std("Finished scan:                ", term_colors("green")+"'"+rep+"'"+term_colors("normal"))
-                reps.extend([d for d in deps if not d in reps])
+    finally:
+        output = end_buffer()
+
+    return (res, deps, output)
+
+def install(*reps, jobs = None, shallow = False):
+    """
+        Install a repositories and its dependencies. Dependencies are
+        scheduled as soon as the repository requiring them has been installed,
+        independent repositories are installed in parallel.
+    """
+
+    ret = True
+
+    if jobs == None:
+        jobs = default_jobs()
+
+    reps = list(filter(lambda x:x, [r.strip() for r in reps]))
+
+    # All the repositories we have already scheduled
+    scheduled = set(reps)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        pending = {executor.submit(install_single, rep, shallow): rep for rep in reps}
+
+        while len(pending) > 0:
+            (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                rep = pending.pop(future)
+                (res, deps, output) = future.result()
+
+                write_buffer(output)
+
+                if not res:
+                    ret = False
+                    continue
+
+                # Schedule all the dependencies we have not seen yet.
+                for dep in deps:
+                    if not dep in scheduled:
+                        scheduled.add(dep)
+                        pending[executor.submit(install_single, dep, shallow)] = dep
+
     return ret
@@ -0,0 +1,140 @@
+"""
+Shared object cache for content repositories.
+
+The cache is a bare git repository that holds the objects of all installed
+repositories. Clones borrow objects from it via objects/info/alternates, so
+installing a repository a second time (e.g. in another workspace on the same
+host) does not need to download it again.
+
+Since clones depend on the objects in the cache, objects are never removed
+from it, not even once they are no longer reachable from any ref (e.g. after
+a branch was deleted or force-pushed upstream).
+
+Shallow and partial clones do not use the cache, as filling it would need
+the full history they are meant to avoid.
+"""
+
+import os
+import os.path
+import threading
+
+from lmh.lib.io import std, err
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.config import get_config
+from lmh.lib.git import do, do_quiet, do_data
+
+# Parallel installs create and fetch into the cache one at a time.
+__cache_lock__ = threading.Lock()
+
+def get_object_cache():
+    """
+        Returns the path to the shared object cache or None if it is disabled.
+    """
+
+    if not get_config("install::object_cache"):
+        return None
+
+    path = get_config("install::object_cache_path")
+    if path == "":
+        return lmh_locate("ext", "objects")
+
+    return os.path.abspath(os.path.expanduser(path))
+
+def init_object_cache():
+    """
+        Creates the shared object cache unless it exists already.
+    """
+
+    path = get_object_cache()
+
+    if path == None:
+        err("The shared object cache is disabled. Enable it with install::object_cache. ")
+        return False
+
+    if os.path.isdir(path):
+        return True
+
+    std("Creating shared object cache in '"+path+"'. ")
+    if not do_quiet(lmh_locate(), "init", "--bare", path):
+        return False
+
+    # clones still need unreachable objects, so never prune them.
+    return do_quiet(path, "config", "gc.pruneExpire", "never")
+
+def update_object_cache(rep, url):
+    """
+        Fetches a repository into the shared object cache. The refs of each
+        repository are kept under their own namespace. Refs deleted upstream
+        are kept as well.
+    """
+
+    path = get_object_cache()
+
+    if path == None:
+        return False
+
+    with __cache_lock__:
+        if not init_object_cache():
+            return False
+
+        return do_quiet(path, "fetch", "--quiet", "--no-auto-gc", url, "+refs/heads/*:refs/remotes/"+rep+"/*")
+
+def object_cache_args(rep, url, partial = False):
+    """
+        Returns arguments for git clone to borrow objects from the shared
+        object cache. Returns no arguments if the cache is disabled or could
+        not be updated.
+
+        @param rep {string} Name of the repository.
+        @param url {string} URL it is cloned from.
+        @param partial {boolean} If the clone is shallow or filtered. Such
+            clones do not use the cache.
+    """
+
+    if partial or get_object_cache() == None:
+        return []
+
+    if not update_object_cache(rep, url):
+        err("   Unable to update shared object cache, cloning without it. ")
+        return []
+
+    return ["--reference-if-able", get_object_cache()]
+
+def gc_object_cache():
+    """
+        Repacks and garbage collects the shared object cache. Unreachable
+        objects are kept, as clones might still use them.
+    """
+
+    path = get_object_cache()
+
+    if path == None or not os.path.isdir(path):
+        err("No shared object cache to clean up. ")
+        return False
+
+    std("Repacking shared object cache ...")
+    if not do(path, "repack", "-a", "-d", "-k"):
+        return False
+
+    std("Running garbage collection ...")
+    return do(path, "gc", "--prune=never")
+
+def print_object_cache():
+    """
+        Prints information about the shared object cache.
+    """
+
+    path = get_object_cache()
+
+    if path == None:
+        std("Shared object cache: ", "disabled")
+        return True
+
+    std("Shared object cache: ", "'"+path+"'")
+
+    if not os.path.isdir(path):
+        std("Not yet created. ")
+        return True
+
+    std(do_data(path, "count-objects", "-v", "-H")[0], newline=False)
+    return True
@@ -1,8 +1,10 @@
-from lmh.lib.io import term_colors, std, err
+from lmh.lib.io import term_colors, std, err, start_buffer, end_buffer, write_buffer, std_summary
+from lmh.lib.utils import parallel_map
 from lmh.lib.repos.git.install import install
 from lmh.lib.git import push as git_push
 from lmh.lib.git import pull as git_pull
-from lmh.lib.git import get_remote_status
+from lmh.lib.git import get_remote_status, is_shallow
+from lmh.lib.git import do as git_do
 from lmh.lib.repos.local.dirs import match_repo
 
 from lmh.lib.repos.git.hooks import hook_pre_pull, hook_post_pull
@@ -10,7 +12,25 @@ from lmh.lib.repos.git.install import install
 
 
 
-def do_pull(rep, needs_update):
+def do_deepen(rep, deepen):
+    """
+        Fetches more history for a shallow clone. Fetches all of it if deepen
+        is 0.
+    """
+
+    path = match_repo(rep, abs=True)
+
+    if not is_shallow(path):
+        return True
+
+    std("Fetching more history ...")
+
+    if deepen == 0:
+        return git_do(path, "fetch", "--unshallow")
+    else:
+        return git_do(path, "fetch", "--deepen="+str(deepen))
+
+def do_pull(rep, needs_update, deepen = None):
     """
         Actually pulls a repository.
     """
@@ -20,12 +40,16 @@ def do_pull(rep, needs_update):
 
     if not hook_pre_pull(rep):
         err("Failed. ")
-        return (False, [])
+        return False
 
     std("Done. ")
 
     ret = True
 
+    if deepen != None and not do_deepen(rep, deepen):
+        err("Failed to fetch more history. ")
+        ret = False
+
     if needs_update:
         std("Running git pull ...")
         rgp = git_pull(match_repo(rep, abs=True))
@@ -41,12 +65,12 @@ def do_pull(rep, needs_update):
     std("Running post-update hook for '"+rep+"' ... ", newline=False)
     if not hook_post_pull(rep):
         err("Failed. ")
-        return (False, [])
+        return False
     std("Done. ")
 
     return ret
 
-def pull(verbose, *repos):
+def pull(verbose, *repos, jobs = None, deepen = None):
     """Pulls all currently installed repositories and updates dependencies"""
 
     # Check if we need to update the local repository
@@ -57,18 +81,43 @@ def pull(verbose, *repos):
         state = get_remote_status(rep)
         return state == "pull" or state == "failed" or state == "divergence"
 
+    # Pulls a single repository and buffers the output
+    def pull_single(rep):
+        start_buffer()
+        try:
+            std(    "Starting update:           ", term_colors("blue")+"'"+rep+"'"+term_colors("normal"))
+
+            needs_update = needs_updating(rep)
+
+            if not do_pull(rep, needs_update, deepen):
+                std("Update failed:             ", term_colors("red")+"'"+rep+"'"+term_colors("normal"))
+                state = "failed"
+            else:
+                std("Update suceeded:           ", term_colors("green")+"'"+rep+"'"+term_colors("normal"))
+                state = "updated" if needs_update else "up-to-date"
+        finally:
+            output = end_buffer()
+
+        return (state, output)
+
     ret = True
 
     repos = list(filter(lambda x:x, [r.strip() for r in repos]))
 
-    for rep in repos:
-        std(    "Starting update:           ", term_colors("blue")+"'"+rep+"'"+term_colors("normal"))
+    # Pull all the repositories in parallel
+    # and print the output one repository at a time.
+    states = []
+    for (rep, (state, output)) in zip(repos, parallel_map(pull_single, repos, jobs)):
+        write_buffer(output)
+        states.append((rep, state))
 
-        if not do_pull(rep, needs_updating(rep)):
-            std("Update failed:             ", term_colors("red")+"'"+rep+"'"+term_colors("normal"))
+        if state == "failed":
             ret = False
-        else:
-            std("Update suceeded:           ", term_colors("green")+"'"+rep+"'"+term_colors("normal"))
 
+    # Print a summary
+    std_summary(states, {"updated": "green", "up-to-date": "normal", "failed": "red"})
+
+    # Dependencies might have changed, so install them now
+    # that all repositories are up-to-date.
     std("Re-installing updated repositories ...")
     return ret and install(*repos)
@@ -1,29 +1,50 @@
-from lmh.lib.io import term_colors, std
+from lmh.lib.io import term_colors, std, buffered, write_buffer, std_summary
+from lmh.lib.utils import parallel_map
 from lmh.lib.repos.git.install import install
 from lmh.lib.git import push as git_push
 from lmh.lib.git import pull as git_pull
 from lmh.lib.git import get_remote_status
 from lmh.lib.repos.local.dirs import match_repo
 
-def push(verbose, *repos):
+def push(verbose, *repos, jobs = None, fetch = True):
     """Pushes all currently installed repositories. """
 
     # Check if we need to update the local repository
     def needs_updating(rep):
-        state = get_remote_status(rep)
+        if verbose:
+            return True
+        state = get_remote_status(rep, fetch)
         return state == "push" or state == "failed" or state == "divergence"
 
-    ret = True
-    
     repos = list(filter(lambda x:x, [r.strip() for r in repos]))
 
+    # Find the repositories that are ahead first, so that
+    # only those need to be pushed.
+    ahead = [rep for (rep, a) in zip(repos, parallel_map(needs_updating, repos, jobs)) if a]
+
+    # Push them in parallel and print the output
+    # one repository at a time.
+    results = parallel_map(buffered(git_push), ahead, jobs)
+    results = dict(zip(ahead, results))
+
+    ret = True
+    states = []
+
     for rep in repos:
         std("git push", rep, "", newline = False)
 
-        if verbose or needs_updating(rep):
-            std()
-            ret = git_push(rep) and ret
-        else:
+        if not rep in results:
             std("OK, nothing to push. ")
+            states.append((rep, "up-to-date"))
+            continue
+
+        std()
+        (res, output) = results[rep]
+        write_buffer(output)
+
+        states.append((rep, "pushed" if res else "failed"))
+        ret = res and ret
+
+    std_summary(states, {"pushed": "green", "up-to-date": "normal", "failed": "red"})
 
     return ret
@@ -0,0 +1,454 @@
+"""
+Trigram index for searching repositories.
+
+For each repository the index stores which .tex files contain which three
+character sequences. Before running a regular expression over a repository,
+lmh find asks the index for the files containing all the literal text the
+expression needs, so most files are never read. Files that changed since the
+index was last updated are always searched, so a stale index is safe to use.
+
+The index is a binary file. It starts with a header and the list of indexed
+files (as JSON), followed by a table of all trigrams sorted by their UTF-8
+encoding and finally the posting lists. Each posting list holds the ids of
+the files containing a trigram in ascending order, stored as variable length
+encoded differences. A lookup binary searches the table and only decodes the
+lists it needs. Files that change get a new id and their old id is simply
+forgotten.
+"""
+
+import os
+import os.path
+import re
+import json
+import time
+import struct
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from string import Template
+
+from lmh.lib.io import err, read_file, walk_files
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import mkdir_p
+from lmh.lib.repos.local.dirs import match_repo
+
+"""Version of the index format. Indexes of other versions are ignored. """
+index_version = 2
+
+"""Bytes every index file starts with. """
+index_magic = b"LMHIDX"
+
+"""Files modified less than this many seconds ago are not indexed. """
+racy_seconds = 2
+
+# magic, version, length of the file list and number of trigrams.
+header_format = struct.Struct("<6sHII")
+
+"""Size of a trigram in the table, in bytes. """
+key_size = 12
+
+# trigram, offset and length of its posting list and the last id in it.
+entry_format = struct.Struct("<"+str(key_size)+"sIII")
+
+def get_index_file(repo):
+    """
+        Returns the file the index of a repository is stored in.
+
+        @param repo {string} Name of the repository.
+    """
+
+    return lmh_locate("cache", "index", repo+".idx")
+
+def trigram_key(trigram):
+    """
+        Returns the key of a trigram in the table of an index.
+    """
+
+    return trigram.encode("utf-8", "surrogatepass").ljust(key_size, b"\0")
+
+def encode_ids(ids, last = -1):
+    """
+        Encodes ascending ids as variable length differences to the previous
+        one, starting from last.
+
+        @returns {bytearray}
+    """
+
+    res = bytearray()
+
+    for i in ids:
+        d = i - last
+        last = i
+        while d >= 0x80:
+            res.append((d & 0x7f) | 0x80)
+            d >>= 7
+        res.append(d)
+
+    return res
+
+def decode_ids(data, start, end):
+    """
+        Decodes the ids encoded in data[start:end] by encode_ids.
+
+        @returns {int[]}
+    """
+
+    ids = []
+    (last, d, shift) = (-1, 0, 0)
+
+    for i in range(start, end):
+        b = data[i]
+        d |= (b & 0x7f) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            last += d
+            ids.append(last)
+            (d, shift) = (0, 0)
+
+    return ids
+
+def read_index(repo):
+    """
+        Reads the index of a repository. Returns None if there is none.
+
+        @param repo {string} Name of the repository.
+
+        @returns {dict} with the list of files, the raw data and where the
+            table and posting lists start.
+    """
+
+    try:
+        with open(get_index_file(repo), "rb") as f:
+            data = f.read()
+
+        (magic, version, files_size, count) = header_format.unpack_from(data, 0)
+        if magic != index_magic or version != index_version:
+            return None
+
+        table = header_format.size + files_size
+        files = json.loads(data[header_format.size:table].decode("utf-8"))
+    except:
+        return None
+
+    return {
+        "files": files,
+        "data": data,
+        "count": count,
+        "table": table,
+        "postings": table + count * entry_format.size
+    }
+
+def index_entries(index):
+    """
+        Yields (key, offset, length, last) for all trigrams in an index.
+    """
+
+    for i in range(index["count"]):
+        yield entry_format.unpack_from(index["data"], index["table"] + i * entry_format.size)
+
+def find_entry(index, trigram):
+    """
+        Finds the entry of a trigram in an index by binary search. Returns
+        None if no indexed file contains it.
+    """
+
+    key = trigram_key(trigram)
+    data = index["data"]
+
+    (lo, hi) = (0, index["count"])
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if entry_format.unpack_from(data, index["table"] + mid * entry_format.size)[0] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    if lo < index["count"]:
+        entry = entry_format.unpack_from(data, index["table"] + lo * entry_format.size)
+        if entry[0] == key:
+            return entry
+
+    return None
+
+def write_index(repo, files, postings):
+    """
+        Writes the index of a repository.
+
+        @param repo {string} Name of the repository.
+        @param files {list} Indexed files, None for unused ids.
+        @param postings {dict} Maps the key of each trigram to a tuple of its
+            encoded posting list and the last id in it.
+    """
+
+    f = get_index_file(repo)
+
+    files_data = json.dumps(files).encode("utf-8")
+    keys = sorted(postings.keys())
+
+    table = bytearray()
+    offset = 0
+    for k in keys:
+        (ids, last) = postings[k]
+        table += entry_format.pack(k, offset, len(ids), last)
+        offset += len(ids)
+
+    try:
+        mkdir_p(os.path.dirname(f))
+
+        # write it in one go, so that readers never see half an index.
+        temp = f+"."+str(os.getpid())+".tmp"
+        try:
+            with open(temp, "wb") as out:
+                out.write(header_format.pack(index_magic, index_version, len(files_data), len(keys)))
+                out.write(files_data)
+                out.write(table)
+                for k in keys:
+                    out.write(postings[k][0])
+            os.replace(temp, f)
+        except:
+            os.remove(temp)
+            raise
+    except:
+        err("Unable to write index for", repo)
+        return False
+
+    return True
+
+def remove_index(repo):
+    """
+        Removes the index of a repository.
+
+        @param repo {string} Name of the repository.
+    """
+
+    try:
+        os.remove(get_index_file(repo))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        err("Unable to remove index for", repo)
+        return False
+
+    return True
+
+def file_key(file):
+    """
+        Returns size and modification time of a file.
+    """
+
+    st = os.stat(file)
+    return [st.st_size, st.st_mtime_ns]
+
+def text_trigrams(text):
+    """
+        Returns the set of all trigrams in a text.
+    """
+
+    return set([text[i:i+3] for i in range(len(text) - 2)])
+
+def update_index(repo, rebuild = False):
+    """
+        Updates the index of a repository. Only reads files that changed
+        since the last update and rebuilds it from scratch once more than half
+        of the file ids are unused.
+
+        @param repo {string} Name of the repository.
+        @param rebuild {boolean} Ignore the existing index.
+
+        @returns {dict} Counts of indexed, updated and removed files.
+    """
+
+    root = match_repo(repo, abs=True)
+
+    # walk_files yields paths below root, so cut it off instead of relpath.
+    prefix = len(os.path.join(root, ""))
+
+    index = None if rebuild else read_index(repo)
+    files = [] if index == None else index["files"]
+
+    ids = dict([(f[0], i) for (i, f) in enumerate(files) if f != None])
+    seen = set()
+
+    # ids to add to each trigram
+    postings = {}
+
+    stats = {"indexed": 0, "updated": 0, "removed": 0}
+
+    for file in walk_files(root, "tex"):
+        rel = file[prefix:]
+        seen.add(rel)
+
+        try:
+            key = file_key(file)
+        except OSError:
+            continue
+
+        i = ids.get(rel)
+        if i != None:
+            if files[i][1:] == key:
+                stats["indexed"] += 1
+                continue
+            files[i] = None
+
+        # the file might change again within the same mtime tick,
+        # so leave it out and have it searched every time.
+        if time.time() - key[1] / 1e9 <= racy_seconds:
+            continue
+
+        i = len(files)
+        files.append([rel] + key)
+
+        for t in text_trigrams(read_file(file)):
+            # NUL is used for padding the keys.
+            if not "\0" in t:
+                postings.setdefault(trigram_key(t), []).append(i)
+
+        stats["indexed"] += 1
+        stats["updated"] += 1
+
+    for (rel, i) in ids.items():
+        if not rel in seen:
+            files[i] = None
+            stats["removed"] += 1
+
+    # Start over if most ids are unused.
+    live = len([f for f in files if f != None])
+    if len(files) > 2 * live:
+        return update_index(repo, rebuild=True)
+
+    if stats["updated"] > 0 or stats["removed"] > 0 or rebuild:
+        # New ids are larger than all old ones, so they can be appended
+        # to the old lists without decoding them.
+        merged = {}
+
+        if index != None:
+            data = index["data"]
+            for (k, offset, length, last) in index_entries(index):
+                start = index["postings"] + offset
+                merged[k] = (bytes(data[start:start+length]), last)
+
+        for (k, lst) in postings.items():
+            (old, last) = merged.get(k, (b"", -1))
+            merged[k] = (old + encode_ids(lst, last), lst[-1])
+
+        write_index(repo, files, merged)
+
+    return stats
+
+def pattern_literals(pattern):
+    """
+        Returns pieces of text that every match of a regular expression
+        contains. Returns an empty list if nothing is known about its matches.
+    """
+
+    try:
+        parsed = sre_parse.parse(pattern)
+    except:
+        return []
+
+    # only look at case sensitive patterns. Before Python 3.8 the global
+    # flags are kept in parsed.pattern.
+    state = parsed.state if hasattr(parsed, "state") else parsed.pattern
+    if state.flags & re.IGNORECASE:
+        return []
+
+    runs = []
+
+    def sequence(items):
+        run = ""
+        for (op, av) in items:
+            if op == sre_parse.LITERAL:
+                run += chr(av)
+                continue
+
+            runs.append(run)
+            run = ""
+
+            # groups only have their own flags from Python 3.6 on.
+            if op == sre_parse.SUBPATTERN and not (len(av) == 4 and av[1] & re.IGNORECASE):
+                sequence(av[-1])
+            elif (op == sre_parse.MAX_REPEAT or op == sre_parse.MIN_REPEAT) and av[0] >= 1:
+                sequence(av[2])
+        runs.append(run)
+
+    sequence(parsed)
+
+    return [r for r in runs if r != ""]
+
+def pattern_trigrams(pattern):
+    """
+        Returns trigrams that every match of a regular expression contains.
+        Returns an empty set if nothing is known about its matches.
+    """
+
+    res = set()
+    for r in pattern_literals(pattern):
+        res.update(text_trigrams(r))
+    return res
+
+def index_candidates(repo, match):
+    """
+        Finds the files of a repository that might match one of the given
+        patterns. $repo in the patterns is replaced with the name of the
+        repository. Returns None if the repository has no index.
+
+        @param repo {string} Name of the repository.
+        @param match {string[]} Patterns to match.
+
+        @returns {string[]}
+    """
+
+    index = read_index(repo)
+
+    if index == None:
+        return None
+
+    root = match_repo(repo, abs=True)
+    prefix = len(os.path.join(root, ""))
+    ids = dict([(f[0], (i, f[1:])) for (i, f) in enumerate(index["files"]) if f != None])
+
+    # ids of files matching any of the patterns, None for all of them.
+    matching = set()
+    for m in match:
+        try:
+            tris = pattern_trigrams(Template(m).substitute(repo=repo))
+        except:
+            tris = set()
+
+        # NUL is used for padding the keys.
+        tris = [t for t in tris if not "\0" in t]
+
+        if len(tris) == 0:
+            matching = None
+            break
+
+        entries = [find_entry(index, t) for t in tris]
+        if None in entries:
+            continue
+
+        # intersect the shortest lists first.
+        found = None
+        for (k, offset, length, last) in sorted(entries, key=lambda e: e[2]):
+            start = index["postings"] + offset
+            lst = decode_ids(index["data"], start, start + length)
+            found = set(lst) if found == None else found.intersection(lst)
+            if len(found) == 0:
+                break
+        matching.update(found)
+
+    res = []
+    for file in walk_files(root, "tex"):
+        (i, key) = ids.get(file[prefix:], (None, None))
+
+        # files that are not (or no longer) indexed are searched anyway.
+        try:
+            if i == None or key != file_key(file) or matching == None or i in matching:
+                res.append(file)
+        except OSError:
+            pass
+
+    return res
@@ -1,17 +1,70 @@
-from lmh.lib.io import err
+import os.path
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lmh.lib.io import err, read_file, write_file
 from lmh.lib.git import exists
 from lmh.lib.config import get_config
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import mkdir_p
 
 import fnmatch
 from string import Template
 
-from urllib.request import urlopen
+import http.client
+from urllib.parse import urlparse, urljoin
 
 try:
     import lxml.html
 except ImportError:
     lxml = False
 
+"""File to cache the sources of repositories in. """
+sources_cache_file = lmh_locate("cache", "sources.json")
+
+def read_sources_cache():
+    """
+        Reads all cached repository sources which have not yet expired.
+    """
+
+    ttl = get_config("install::sources_ttl")
+
+    if ttl == 0:
+        return {}
+
+    try:
+        data = json.loads(read_file(sources_cache_file))
+    except:
+        return {}
+
+    now = time.time()
+
+    return dict([(name, data[name]["url"]) for name in data if now - data[name]["time"] < ttl])
+
+def write_sources_cache(name, url):
+    """
+        Stores the source of a repository in the cache.
+    """
+
+    if get_config("install::sources_ttl") == 0:
+        return
+
+    with find_source.lock:
+        try:
+            data = json.loads(read_file(sources_cache_file))
+        except:
+            data = {}
+
+        data[name] = {"url": url, "time": time.time()}
+
+        try:
+            mkdir_p(os.path.dirname(sources_cache_file))
+            write_file(sources_cache_file, json.dumps(data, indent=4))
+        except:
+            err("Unable to write sources cache. ")
+
 def find_source(name, quiet = False):
     """
         Finds the source of a repository.
@@ -19,24 +72,40 @@ def find_source(name, quiet = False):
         @param quiet - Should we print output.
     """
 
+    # Load the cache from disk once.
+    with find_source.lock:
+        if find_source.cache == None:
+            find_source.cache = read_sources_cache()
+
     # Check if the result is cached.
     # In that case we won't have to query again.
     if name in find_source.cache:
         return find_source.cache[name]
 
-
     # Iterate over the root urls
     # and the suffixes.
     root_urls = get_config("install::sources").rsplit(";")
     root_suffix = ["", ".git"]
 
+    candidates = [url+name+url_suf for url in root_urls for url_suf in root_suffix]
 
-    for url in root_urls:
-        for url_suf in root_suffix:
+    # Check all the candidates at once, but prefer them in order.
+    # So we can stop as soon as all better ones have failed.
+    executor = ThreadPoolExecutor(max_workers=len(candidates))
+    probes = [executor.submit(exists, url, False) for url in candidates]
+    try:
+        for (url, probe) in zip(candidates, probes):
             # Check if the remote repository exists.
-            if exists(url+name+url_suf, False):
-                find_source.cache[name] = url+name+url_suf
-                return url+name+url_suf
+            if probe.result():
+                find_source.cache[name] = url
+                write_sources_cache(name, url)
+                return url
+    finally:
+        # Cancel the probes that did not start yet. Running ones can not be
+        # stopped, they finish in the background.
+        for probe in probes:
+            probe.cancel()
+        executor.shutdown(wait=False)
 
     # We could not find any matching remote.
     # So send an error message unless we are quiet.
@@ -47,9 +116,199 @@ def find_source(name, quiet = False):
     # and we failed.
     return False
 
-find_source.cache = {}
+find_source.cache = None
+find_source.lock = threading.Lock()
+
+"""File to store the catalog of remote repositories in. """
+remote_catalog_file = lmh_locate("cache", "remote.json")
+
+"""Number of projects listed on a full page. """
+projects_per_page = 20
+
+"""Maximal number of pages to fetch. """
+max_pages = 99
+
+"""Number of pages to fetch at once. """
+page_workers = 8
+
+# Per-thread connections to the remote
+__connections__ = threading.local()
+
+def fetch_url(url, headers = {}):
+    """
+        Makes a GET request and returns a tuple (status, headers, body). Keeps
+        one connection per host open in each thread and follows redirects.
+    """
+
+    if getattr(__connections__, "conns", None) == None:
+        __connections__.conns = {}
+
+    conns = __connections__.conns
+
+    for redirect in range(5):
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path + ("?"+parsed.query if parsed.query else "")
+
+        # try again once with a new connection if the old one was closed.
+        for attempt in range(2):
+            if not key in conns:
+                if parsed.scheme == "https":
+                    conns[key] = http.client.HTTPSConnection(parsed.netloc, timeout=30)
+                else:
+                    conns[key] = http.client.HTTPConnection(parsed.netloc, timeout=30)
+            try:
+                conns[key].request("GET", path, headers=headers)
+                response = conns[key].getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                conns.pop(key).close()
+                if attempt == 1:
+                    raise
+
+        if response.status in [301, 302, 303, 307, 308] and response.getheader("Location"):
+            url = urljoin(url, response.getheader("Location"))
+        else:
+            return (response.status, response, body)
+
+    raise http.client.HTTPException("Too many redirects")
+
+def fetch_page(i, cached):
+    """
+        Fetches the projects listed on a page of the remote. Revalidates the
+        cached version of the page if it is given.
+
+        @param i - Number of page to fetch.
+        @param cached - Cached page from the catalog or None.
+
+        @returns {dict} the new page for the catalog
+    """
+
+    # the project pages url
+    url = get_config("gl::projects_url")+'?page='+str(i)
+
+    # make a conditional request if we know the page already.
+    headers = {}
+    if cached != None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+
+    (status, response, body) = fetch_url(url, headers)
 
-def ls_remote(*spec):
+    if status == 304 and cached != None:
+        return cached
+
+    if status != 200:
+        raise http.client.HTTPException("Got status "+str(status)+" for "+url)
+
+    # parse the html
+    project_list_page = lxml.html.fromstring(body)
+
+    # find all <a class='project'> .hrefs
+    projects = project_list_page.xpath("//a[@class='project']/@href")
+
+    # and remove the starting /s
+    projects = list(map(lambda s:s[1:] if s.startswith("/") else s, projects))
+
+    return {
+        "etag": response.getheader("ETag"),
+        "modified": response.getheader("Last-Modified"),
+        "projects": projects
+    }
+
+def read_remote_catalog():
+    """
+        Reads the cached pages of remote repositories.
+    """
+
+    try:
+        return json.loads(read_file(remote_catalog_file))
+    except:
+        return {}
+
+def write_remote_catalog(pages):
+    """
+        Writes the cached pages of remote repositories.
+    """
+
+    try:
+        mkdir_p(os.path.dirname(remote_catalog_file))
+        write_file(remote_catalog_file, json.dumps(pages, indent=4))
+    except:
+        err("Unable to write catalog of remote repositories. ")
+
+def get_remote_projects(offline = False):
+    """
+        Gets a set of all remote projects. Fetches pages concurrently and
+        stores them in the catalog.
+
+        @param offline - Only use the catalog.
+    """
+
+    catalog = read_remote_catalog()
+
+    projects = set()
+    pages = {}
+
+    if offline:
+        for i in range(1, max_pages + 1):
+            page = catalog.get(str(i))
+            if page == None:
+                break
+
+            projects.update(page["projects"])
+
+            # if we have fewer projects then the max, we can exit now
+            if len(page["projects"]) < projects_per_page:
+                break
+
+        return projects
+
+    jobs = page_workers
+    complete = False
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        def load_page(i):
+            try:
+                return fetch_page(i, catalog.get(str(i)))
+            except Exception as e:
+                return e
+
+        # fetch a batch of pages at once until we find the last one.
+        start = 1
+        while not complete and not failed and start <= max_pages:
+            batch = range(start, min(start + jobs, max_pages + 1))
+            start += jobs
+
+            for (i, page) in zip(batch, executor.map(load_page, batch)):
+                if isinstance(page, Exception):
+                    err(page)
+                    err("Unable to make connection (make sure gl::projects_url is correct)")
+                    failed = True
+                    break
+
+                pages[str(i)] = page
+                projects.update(page["projects"])
+
+                # if we have fewer projects then the max, we can exit now
+                if len(page["projects"]) < projects_per_page:
+                    complete = True
+                    break
+
+    # Only forget about old pages if we have seen everything.
+    if not complete:
+        catalog.update(pages)
+        pages = catalog
+
+    write_remote_catalog(pages)
+
+    return projects
+
+def ls_remote(*spec, offline = False):
     """Lists remote repositories matching some specification. """
 
     if lxml == False:
@@ -65,43 +324,7 @@ def ls_remote(*spec):
     if len(spec) == 0:
         spec = ["*"]
 
-    # The basic url
-    base_url = "http://gl.mathhub.info/public/"
-    projects_per_page = 20
-    projects = set()
-
-    for i in range(1, 100):
-        # the project pages url
-        url = base_url+'?page='+str(i)
-
-        # make the request
-        try:
-            response = urlopen(url)
-            response = response.read()
-            
-        except:
-            err("Unable to make connection")
-            break
-
-        try:
-            # parse the html
-            project_list_page = lxml.html.fromstring(response)
-            
-            # find all <a class='project'> .hrefs
-            new_projects = project_list_page.xpath("//a[@class='project']/@href")
-            
-            # and remove the starting /s
-            new_projects = list(map(lambda s:s[1:] if s.startswith("/") else s, new_projects))
-            
-            # if we have fewer projects then the max, we can exit now
-            if len(new_projects) < projects_per_page:
-                break
-            
-            projects.update(new_projects)
-            
-        except Exception as e:
-            err(e)
-            err("Parsing failure (make sure gl::projects_url is correct)")
+    projects = get_remote_projects(offline)
 
     matched_projects = set()
 
@@ -109,11 +332,10 @@ def ls_remote(*spec):
         matches = [p for p in projects if fnmatch.fnmatch(p, s)]
         if len(matches) == 0:
             matches = [p for p in projects if fnmatch.fnmatch(p, s+"/*")]
+        if len(matches) == 0 and not offline and find_source(s, True):
+            matches = [s]
         if len(matches) == 0:
-            if find_source(s, True):
-                matches = [s]
-            else:
-                err("Warning: No modules matching", s, "found. ")
+            err("Warning: No modules matching", s, "found. ")
         matched_projects.update(matches)
 
     return sorted(matched_projects)
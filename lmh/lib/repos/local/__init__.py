@@ -1,21 +1,30 @@
 import os
 import os.path
 import re
+import heapq
+import subprocess
+import itertools
 
 from lmh.lib.dirs import lmh_locate
-from lmh.lib.io import term_colors, find_files, std, std_paged, err, write_file, read_file, read_file_lines
+from lmh.lib.utils import parallel_map, process_map
+from lmh.lib.io import term_colors, find_files, walk_files, std, std_paged_iter, err, write_file, read_file, read_file_lines, buffered, write_buffer, std_summary
 
 # Git imports
-from lmh.lib.git import status_pipe as git_status
+from lmh.lib.git import status as git_status
 from lmh.lib.git import commit as git_commit
 from lmh.lib.git import do as git_do
+from lmh.lib.git import do_code as git_do_code
+from lmh.lib.git import do_prefixed as git_do_prefixed
 from lmh.lib.git import do_data as git_do_data
+from lmh.lib.git import do_output as git_do_output
 from lmh.lib.git import get_remote_status
-from lmh.lib.git import is_tracked
+from lmh.lib.git import tracked_files
 
 from lmh.lib.repos.local.dirs import match_repo, match_repos, find_repo_dir
 
 from lmh.lib.repos.local.package import get_package_dependencies
+from lmh.lib.repos.local.depcache import read_depcache, write_depcache, cached_deps
+from lmh.lib.modules.imports import find_file_imports
 
 
 def match_repo_args(spec, all=False, abs=True):
@@ -36,62 +45,123 @@ def is_clean(repo):
     """Checks if a working directory is clean. """
     return git_do_data(repo, "status", "--porcelain")[0] == ""
 
-def status(repos, show_unchanged, remote, *args):
+def status(repos, show_unchanged, remote, *args, jobs = None, fetch = True):
     """Does git status on all installed repositories """
 
+    def get_status(rep):
+        # If we are clean, do nothing
+        if is_clean(rep) and not show_unchanged:
+            return None
+
+        r_status = get_remote_status(rep, fetch) if remote else None
+
+        return (r_status, git_status(rep, *args))
+
     ret = True
 
-    for rep in repos:
+    # run the checks in parallel, but print them in order.
+    for (rep, res) in zip(repos, parallel_map(get_status, repos, jobs)):
 
-        # If we are clean, do nothing
-        if is_clean(rep) and not show_unchanged:
+        if res == None:
             continue
 
+        (r_status, val) = res
+
         std("git status", rep)
 
-        if remote:
-            r_status = get_remote_status(rep)
-            if r_status == "failed":
-                std("Remote status:", term_colors("red")+"Unknown (network issues)", term_colors("normal"))
-            elif r_status == "ok":
-                std("Remote status:", term_colors("green")+"Up-to-date", term_colors("normal"))
-            elif r_status == "pull":
-                std("Remote status:", term_colors("yellow")+"New commits on remote, please pull. ", term_colors("normal"))
-            elif r_status == "push":
-                std("Remote status:", term_colors("yellow")+"New local commits, please push. ", term_colors("normal"))
-            elif r_status == "divergence":
-                std("Remote status:", term_colors("red")+"Remote and local versions have diverged. ", term_colors("normal"))
-
-        val = git_status(rep, *args)
-        if not val:
+        if r_status == "failed":
+            std("Remote status:", term_colors("red")+"Unknown (network issues)", term_colors("normal"))
+        elif r_status == "ok":
+            std("Remote status:", term_colors("green")+"Up-to-date", term_colors("normal"))
+        elif r_status == "pull":
+            std("Remote status:", term_colors("yellow")+"New commits on remote, please pull. ", term_colors("normal"))
+        elif r_status == "push":
+            std("Remote status:", term_colors("yellow")+"New local commits, please push. ", term_colors("normal"))
+        elif r_status == "divergence":
+            std("Remote status:", term_colors("red")+"Remote and local versions have diverged. ", term_colors("normal"))
+
+        if val == False:
             err("Unable to run git status on", rep)
             ret = False
+        else:
+            std(val, newline=False)
 
     return ret
 
-def commit(msg, verbose, *repos):
+def commit(msg, verbose, *repos, jobs = None):
     """Commits all installed repositories """
 
+    # Find the repositories with changes first, so that
+    # clean ones do not need a worker at all.
+    def is_dirty(rep):
+        return verbose or git_do_data(rep, "status", "--porcelain")[0] != ""
+
+    dirty = [rep for (rep, d) in zip(repos, parallel_map(is_dirty, repos, jobs)) if d]
+
+    # Commit all the dirty repositories in parallel
+    # and print the output one repository at a time.
+    results = parallel_map(buffered(lambda rep: git_commit(rep, "-a", "-m", msg)), dirty, jobs)
+    results = dict(zip(dirty, results))
+
     ret = True
+    states = []
 
     for rep in repos:
         std("git commit", rep, "", newline=False)
-        if verbose or git_do_data(rep, "status", "--porcelain")[0] != "":
-            std()
-            ret = git_commit(rep, "-a", "-m", msg) and ret
-        else:
+
+        if not rep in results:
             std("Ok, nothing to commit. ")
+            states.append((rep, "clean"))
+            continue
+
+        std()
+        (res, output) = results[rep]
+        write_buffer(output)
+
+        states.append((rep, "committed" if res else "failed"))
+        ret = res and ret
+
+    std_summary(states, {"committed": "green", "clean": "normal", "failed": "red"})
+
     return ret
 
-def do(cmd, args, *repos):
+def do(cmd, args, *repos, jobs = 1, prefix = False):
     """Does an arbitraty git commit on all repositories. """
+
     ret = True
     if args == None:
-        args = [""]
-    args = args[0].split(" ")
-    for rep in repos:
-        std("git "+cmd, args[0], rep)
-        ret = git_do(rep, cmd, *args) and ret
+        args = []
+
+    # run one after the other with output as is.
+    if jobs == 1 and not prefix:
+        for rep in repos:
+            std("git "+cmd, " ".join(args), rep)
+            ret = git_do(rep, cmd, *args) and ret
+
+        return ret
+
+    # run in parallel, grouping or prefixing the output.
+    def do_single(rep):
+        if prefix:
+            return (git_do_prefixed(rep, match_repo(rep)+": ", cmd, *args), [])
+        else:
+            return buffered(git_do_code)(rep, cmd, *args)
+
+    codes = []
+    for (rep, (code, output)) in zip(repos, parallel_map(do_single, repos, jobs)):
+        if not prefix:
+            std("git "+cmd, " ".join(args), rep)
+            write_buffer(output)
+        codes.append((rep, code))
+
+    # and print the exit codes
+    std("---")
+    std("Exit codes:")
+    for (rep, code) in codes:
+        color = "green" if code == 0 else "red"
+        std("   "+term_colors(color)+str(code).rjust(4)+term_colors("normal"), match_repo(rep))
+        ret = ret and code == 0
+    std("---")
 
     return ret
 
@@ -100,8 +170,10 @@ def git_clean(repo):
 
     return do("clean", ["-f"], repo)
 
-def rm_untracked(file, t = ""):
-    if not is_tracked(file):
+def rm_untracked(file, tracked, t = ""):
+    """Removes a file unless it is in the set of tracked files. """
+
+    if not file in tracked:
         try:
             os.remove(file)
             std("Removed", t, file)
@@ -110,12 +182,13 @@ def rm_untracked(file, t = ""):
             return False
     return True
 
-def clean_orphans(d):
+def clean_orphans(d, tracked):
     """Cleans out orphaned files int he given directory"""
 
     res = True
 
     (texs, omdocs, pdfs, sms) = find_files(d, "tex", "omdoc", "pdf", "sms")
+    texs = set(texs)
 
     #
     # Orphaned omdocs
@@ -123,7 +196,7 @@ def clean_orphans(d):
 
     for file in omdocs:
         if not (file[:-len(".omdoc")]+".tex" in texs):
-            if not rm_untracked(file, "orphaned omdoc"):
+            if not rm_untracked(file, tracked, "orphaned omdoc"):
                 res = False
 
     #
@@ -132,7 +205,7 @@ def clean_orphans(d):
 
     for file in pdfs:
         if not (file[:-len(".pdf")]+".tex" in texs):
-            if not rm_untracked(file, "orphaned pdf"):
+            if not rm_untracked(file, tracked, "orphaned pdf"):
                 res = False
 
     #
@@ -141,83 +214,114 @@ def clean_orphans(d):
 
     for file in sms:
         if not (file[:-len(".sms")]+".tex" in texs):
-            if not rm_untracked(file, "orphaned sms"):
+            if not rm_untracked(file, tracked, "orphaned sms"):
                 res = False
 
     return res
 
-def clean_logs(d):
+def clean_logs(d, tracked):
     """Cleans out logs in the given directory. """
 
+    res = True
+
     (ltxlog, pdflog) = find_files(d, "ltxlog", "pdflog")
 
     for f in ltxlog+pdflog:
-        if not rm_untracked(f, "log file"):
+        if not rm_untracked(f, tracked, "log file"):
             res = False
-    res = True
 
     return res
 
 def clean(repo, git_clean = False):
-    res = clean_orphans(repo)
-    res = clean_logs(repo) and res
+    """Cleans up generated files in a repository. """
+
+    # find all the tracked files once.
+    tracked = tracked_files(repo)
+
+    res = clean_orphans(repo, tracked)
+    res = clean_logs(repo, tracked) and res
 
     if git_clean:
-        res = git_clean(repo) and res
+        res = do("clean", ["-f"], repo) and res
     return res
 
-def log(ordered, *repos):
+"""Number of log entries read from a single git log process. """
+log_page_size = 1000
+
+def log_entries(repo, *args, limit = None, failed = None):
+    """
+        Lazily reads log entries of a repository, newest first, with one git
+        log process per page of log_page_size entries and NUL-delimited
+        fields. A page is only read once the previous one has been consumed,
+        so many repositories can be read at the same time with bounded memory
+        and without a process waiting for each of them. If git log fails, its
+        error is printed and the repository is added to failed.
+    """
+
+    fields = ["hash", "subject", "date", "date_human", "author", "author_mail"]
+    fmt = "%x00".join(["%h", "%s", "%ct", "%ad", "%an", "%ae"])
+
+    name = match_repo(repo)
+
+    skip = 0
+
+    try:
+        while limit == None or skip < limit:
+            count = log_page_size if limit == None else min(log_page_size, limit - skip)
+            out = git_do_output(repo, "log", "--pretty=tformat:"+fmt, "--skip="+str(skip), "--max-count="+str(count), *args)
+            lines = [line for line in out.split("\n") if line != ""]
+
+            for line in lines:
+                entry = dict(zip(fields, line.split("\0")))
+                entry["date"] = int(entry["date"])
+                entry["repo"] = name
+                yield entry
+
+            if len(lines) < count:
+                break
+
+            skip += count
+    except subprocess.CalledProcessError as e:
+        err("Unable to read log of", str(name)+" (git log exited with code "+str(e.returncode)+"):")
+        err(e.stderr.decode("utf-8", "replace").rstrip("\n"))
+        if failed != None:
+            failed.append(repo)
+    except OSError as e:
+        err("Unable to read log of", str(name)+":", e)
+        if failed != None:
+            failed.append(repo)
+
+def log(ordered, *repos, limit = None, since = None, jobs = None):
     """Prints out log messages on all repositories. """
-    ret = True
-
-    def get_log(repo):
-        get_format = lambda frm:git_do_data(repo, "log", "--pretty=format:"+frm+"")[0].split("\n")
-
-        hash_short = get_format("%h")
-        commit_titles = get_format("%s")
-        dates = get_format("%at")
-        dates_human = get_format("%ad")
-        author_names = get_format("%an")
-        author_mails = get_format("%ae")
-
-        res = [{
-                "hash": hash_short[i],
-                "subject": commit_titles[i],
-                "date": int(dates[i]),
-                "date_human": dates_human[i],
-                "author": author_names[i],
-                "author_mail": author_mails[i],
-                "repo": match_repo(repo)
-        } for i in range(len(hash_short))]
 
-        return res
-
-    entries = []
-
-    for rep in repos:
-        try:
-            entries.extend(get_log(rep))
-        except Exception as e:
-            err(e)
-            ret = False
+    args = []
+    if since != None:
+        args.append("--since="+since)
 
+    failed = []
 
     if ordered:
-        entries.sort(key=lambda e: -e["date"])
+        # merge the logs lazily, they are already sorted
+        entries = heapq.merge(*[log_entries(rep, *args, limit=limit, failed=failed) for rep in repos], key=lambda e: -e["date"])
+    else:
+        # read logs in parallel, but keep the order of repositories.
+        entries = itertools.chain.from_iterable(parallel_map(lambda rep:list(log_entries(rep, *args, limit=limit, failed=failed)), repos, jobs))
 
-    strout = ""
+    if limit != None:
+        entries = itertools.islice(entries, limit)
 
-    for entry in entries:
-        strout += "\nRepo:    " + entry["repo"]
+    def format_entry(entry):
+        strout  = "\nRepo:    " + entry["repo"]
         strout += "\nSubject: " + entry["subject"]
         strout += "\nHash:    " + entry["hash"]
         strout += "\nAuthor:  " + entry["author"] + " <" + entry["author_mail"] + ">"
         strout += "\nDate:    " + entry["date_human"]
         strout += "\n"
+        return strout
 
-    std_paged(strout, newline=False)
+    std_paged_iter(map(format_entry, entries))
 
-    return ret
+    return len(failed) == 0
 
 def write_deps(dirname, deps):
     """Writes dependencies into a given module. """
@@ -228,16 +332,59 @@ def write_deps(dirname, deps):
     std("Wrote new dependencies to", f)
 
 
-def calc_deps(repos, apply = False):
+def calc_deps(repos, apply = False, stats = False, jobs = None):
     """Crawls for dependencies in a given directory. """
 
     # Match the repositories
     mrepos = [match_repo(r) for r in repos]
 
+    # Crawl them in parallel, that is the expensive part
+    crawled = process_map(crawl_deps_stats, mrepos, jobs)
+
     # return each calculated dependency tree
-    return [calc_deps_single(mr, apply = apply) for mr in mrepos]
+    return [calc_deps_single(mr, apply = apply, stats = stats, crawled = c) for (mr, c) in zip(mrepos, crawled)]
 
-def calc_deps_single(repo, apply = False):
+def find_dep_paths(file):
+    """Finds all repositories imported by a file. """
+
+    return [i["repo"] for i in find_file_imports(file) if i["repo"] != None]
+
+def crawl_deps(repo, stats = None):
+    """
+        Finds all repositories imported by the files of a repository. Only
+        files that changed since the last crawl are read.
+
+        @param repo {string} Name of the repository.
+        @param stats {dict} If given, counts cache hits and misses.
+
+        @returns {string[]}
+    """
+
+    if stats == None:
+        stats = {"hits": 0, "misses": 0}
+
+    old_cache = read_depcache(repo)
+    new_cache = {}
+
+    paths = set()
+    for file in walk_files(find_repo_dir(repo), "tex"):
+        paths.update(cached_deps(file, find_dep_paths, old_cache, new_cache, stats))
+
+    if new_cache != old_cache:
+        write_depcache(repo, new_cache)
+
+    return sorted(paths)
+
+def crawl_deps_stats(repo):
+    """
+        Like crawl_deps, but returns a tuple of the repositories and the cache
+        statistics. Used by worker processes.
+    """
+
+    stats = {"hits": 0, "misses": 0}
+    return (crawl_deps(repo, stats), stats)
+
+def calc_deps_single(repo, apply = False, stats = False, crawled = None):
 
     # Log message
     std("Checking dependencies for:   ", repo)
@@ -247,32 +394,17 @@ def calc_deps_single(repo, apply = False):
 
     # Getting the real dependencies
     given_dependencies = get_package_dependencies(repo)+[repo]
-    given_dependencies = list(set(given_dependencies))
+    given_dependencies = sorted(set(given_dependencies))
 
     # All the required paths
     real_paths = {}
 
-    for root, dirs, files in os.walk(dirname):
-        path = root.split('/')
-        for file in files:
-            fileName, fileExtension = os.path.splitext(file)
-            if fileExtension != ".tex":
-                continue
-
-            # read the file
-            for f in read_file_lines(os.path.join(root, file)):
-
-                for find in re.findall(r"\\(usemhvocab|usemhmodule|adoptmhmodule|importmhmodule)\[(([^\]]*),)?repos=([^,\]]+)(\s*)(,([^\]])*)?\]", f):
-                    real_paths[find[3]] = True
-
-                for find in re.findall(r"\\(usemodule|adoptmodule|importmodule|usevocab)\[([^\]]+)\]", f):
-                    real_paths[find[1]] = True
-
-                for find in re.findall(r"\\(MathHub){([^\}]+)}", f):
-                    real_paths[find[1]] = True
+    if crawled == None:
+        crawled = crawl_deps_stats(repo)
 
-                for find in re.findall(r"\\(gimport|guse|gadpot)\[([^\]]+)\]", f):
-                    real_paths[find[1]] = True
+    (paths, cache_stats) = crawled
+    for path in paths:
+        real_paths[path] = True
 
     # Now only take paths which have exactly two parts
     real_dependencies = []
@@ -282,7 +414,7 @@ def calc_deps_single(repo, apply = False):
             continue
         real_dependencies.append(comps[0]+"/"+comps[1])
 
-    real_dependencies = list(set(real_dependencies))
+    real_dependencies = sorted(set(real_dependencies))
 
     # No need to require itself
     while repo in real_dependencies: real_dependencies.remove(repo)
@@ -306,6 +438,9 @@ def calc_deps_single(repo, apply = False):
     }
 
     std("---")
+    if stats:
+        total = cache_stats["hits"] + cache_stats["misses"]
+        std("Dependency cache hits:     ", cache_stats["hits"], "of", total, "files", "("+str(100 * cache_stats["hits"] // max(total, 1))+"%)")
     if len(ret["fine"]) > 0:
         std(term_colors("green"),  "Used dependencies:         ", term_colors("normal"), ", ".join(ret["fine"]))
     if len(ret["not_needed"]) > 0:
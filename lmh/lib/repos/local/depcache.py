@@ -0,0 +1,93 @@
+import os
+import os.path
+import json
+import time
+
+from lmh.lib.io import err, read_file, write_file
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import mkdir_p
+
+"""Files modified less than this many seconds ago are not cached. """
+racy_seconds = 2
+
+"""Version of the cache format. Caches of other versions are ignored. """
+depcache_version = 2
+
+def get_depcache_file(repo):
+    """
+        Returns the file the dependency cache of a repository is stored in.
+
+        @param repo {string} Name of the repository.
+    """
+
+    return lmh_locate("cache", "deps", repo+".json")
+
+def read_depcache(repo):
+    """
+        Reads the dependency cache of a repository. Returns an empty cache if
+        there is none yet.
+
+        @param repo {string} Name of the repository.
+
+        @returns {dict}
+    """
+
+    try:
+        cache = json.loads(read_file(get_depcache_file(repo)))
+    except:
+        return {}
+
+    if cache.get("version") != depcache_version:
+        return {}
+
+    return cache["files"]
+
+def write_depcache(repo, cache):
+    """
+        Writes the dependency cache of a repository.
+
+        @param repo {string} Name of the repository.
+        @param cache {dict} Cache to write.
+    """
+
+    f = get_depcache_file(repo)
+
+    try:
+        mkdir_p(os.path.dirname(f))
+        write_file(f, json.dumps({"version": depcache_version, "files": cache}))
+    except:
+        err("Unable to write dependency cache. ")
+
+def cached_deps(file, extract, old, new, stats):
+    """
+        Returns the dependencies of a single file. Uses the old cache if the
+        size and modification time of the file are unchanged, otherwise
+        calls extract.
+
+        @param file {string} File to get dependencies for.
+        @param extract {function} Extracts dependencies from a file.
+        @param old {dict} Cache to read from.
+        @param new {dict} Cache to write the result to.
+        @param stats {dict} Counts hits and misses.
+
+        @returns {list}
+    """
+
+    st = os.stat(file)
+    key = [st.st_size, st.st_mtime_ns]
+
+    entry = old.get(file)
+
+    if entry != None and entry["key"] == key:
+        stats["hits"] += 1
+        deps = entry["deps"]
+    else:
+        stats["misses"] += 1
+        deps = extract(file)
+
+    # the file might change again within the same mtime tick
+    # so only remember it if it is old enough.
+    if time.time() - st.st_mtime > racy_seconds:
+        new[file] = {"key": key, "deps": deps}
+
+    return deps
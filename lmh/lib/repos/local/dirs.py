@@ -1,7 +1,6 @@
 import os
 import re
 import os.path
-import glob
 
 from lmh.lib.io import is_string
 from lmh.lib.dirs import lmh_locate
@@ -11,6 +10,8 @@ from lmh.lib.utils import remove_doubles
 
 from lmh.lib.git import is_repo
 
+from lmh.lib.repos.local.registry import glob_repos
+
 
 def is_in_data(path):
     """
@@ -219,9 +220,8 @@ def find_repo_subdirs(path):
     else:
         return []
 
-    # now we can match the paths via glob.glob
-    # and check that they exist
-    return list(filter(is_repo, glob.glob(name)))
+    # now we can match the paths against the installed repositories
+    return glob_repos(name)
 
 
 def match_repo(repo, root=os.getcwd(), abs=False, existence=True):
@@ -268,7 +268,7 @@ def match_repos(repos, root=os.getcwd(), abs=False):
         @param {string} root - Root directory to use
         @param {boolean} [abs=False] - Should absolute paths be returned?
 
-        @returns string[] - repository paths
+        @returns string[] - repository paths, sorted
     """
 
     # For each element do the following:
@@ -334,11 +334,8 @@ def match_repos(repos, root=os.getcwd(), abs=False):
         else:
             names = lmh_locate("content", names)
 
-        # now expand with the help of globs
-        names = glob.glob(names)
-
-        # and check if they exist
-        names = list(filter(is_repo, names))
+        # now match against the installed repositories
+        names = glob_repos(names)
 
         # if we found something
         # we should through the item
@@ -358,6 +355,6 @@ def match_repos(repos, root=os.getcwd(), abs=False):
 
     # if we want the relative paths we need to set them properly.
     if not abs:
-        return [os.path.relpath(d, lmh_locate("content")) for d in results]
+        return sorted([os.path.relpath(d, lmh_locate("content")) for d in results])
 
-    return list(results)
+    return sorted(results)
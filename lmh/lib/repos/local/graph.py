@@ -0,0 +1,282 @@
+"""
+Dependency graph of all installed repositories.
+
+A repository depends on another one if it lists it in its MANIFEST.MF or
+imports modules from it. The graph is cached, so that it can be queried
+without reading any repository.
+"""
+
+import os
+import os.path
+import json
+
+from lmh.lib.io import err, read_file, write_file
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import mkdir_p
+
+from lmh.lib.repos.local import crawl_deps
+from lmh.lib.repos.local.package import get_package_dependencies
+from lmh.lib.repos.local.registry import installed_repos
+from lmh.lib.repos.local.depcache import get_depcache_file, read_depcache
+
+"""File to cache the dependency graph in. """
+graph_file = lmh_locate("cache", "graph.json")
+
+"""Version of the cache format. Caches of other versions are ignored. """
+graph_version = 1
+
+class DependencyGraph:
+    def __init__(self, manifest, imports):
+        """
+            Creates a new dependency graph.
+
+            @param manifest {dict} Maps each installed repository to the
+                repositories listed in its MANIFEST.MF.
+            @param imports {dict} Maps each installed repository to the
+                repositories it imports modules from.
+        """
+
+        self.manifest = dict([(r, set(d)) for (r, d) in manifest.items()])
+        self.imports = dict([(r, set(d) - set([r])) for (r, d) in imports.items()])
+        self.installed = set(self.manifest.keys())
+
+        # all the edges and their reverse.
+        self.edges = {}
+        self.reverse = {}
+
+        for r in self.installed:
+            self.edges[r] = (self.manifest[r] | self.imports.get(r, set())) - set([r])
+
+        for (r, deps) in list(self.edges.items()):
+            self.reverse.setdefault(r, set())
+            for d in deps:
+                self.edges.setdefault(d, set())
+                self.reverse.setdefault(d, set()).add(r)
+
+    def repos(self):
+        """
+            Returns all repositories in the graph, including dependencies that
+            are not installed.
+        """
+
+        return sorted(self.edges.keys())
+
+    def __closure(self, adj, repos):
+        seen = set()
+        todo = list(repos)
+
+        while len(todo) > 0:
+            for n in adj.get(todo.pop(), ()):
+                if not n in seen:
+                    seen.add(n)
+                    todo.append(n)
+
+        return sorted(seen)
+
+    def dependencies(self, repo, transitive = False):
+        """
+            Returns the repositories a repository depends on.
+
+            @param repo {string} Repository to look at.
+            @param transitive {boolean} Also return indirect dependencies.
+        """
+
+        if transitive:
+            return self.__closure(self.edges, [repo])
+        return sorted(self.edges.get(repo, ()))
+
+    def dependents(self, repo, transitive = False):
+        """
+            Returns the repositories that depend on a repository.
+
+            @param repo {string} Repository to look at.
+            @param transitive {boolean} Also return indirect dependents.
+        """
+
+        if transitive:
+            return self.__closure(self.reverse, [repo])
+        return sorted(self.reverse.get(repo, ()))
+
+    def components(self):
+        """
+            Returns the strongly connected components of the graph. Each
+            component comes after all the components it depends on.
+
+            @returns {string[][]}
+        """
+
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        res = []
+
+        def visit(n):
+            index[n] = low[n] = len(index)
+            stack.append(n)
+            on_stack.add(n)
+            work.append((n, iter(sorted(self.edges[n]))))
+
+        # Tarjan's algorithm, without recursion.
+        for root in self.repos():
+            if root in index:
+                continue
+
+            work = []
+            visit(root)
+
+            while len(work) > 0:
+                (n, it) = work[-1]
+
+                for m in it:
+                    if not m in index:
+                        visit(m)
+                        break
+                    elif m in on_stack:
+                        low[n] = min(low[n], index[m])
+                else:
+                    work.pop()
+                    if len(work) > 0:
+                        p = work[-1][0]
+                        low[p] = min(low[p], low[n])
+
+                    if low[n] == index[n]:
+                        comp = []
+                        while True:
+                            m = stack.pop()
+                            on_stack.remove(m)
+                            comp.append(m)
+                            if m == n:
+                                break
+                        res.append(sorted(comp))
+
+        return res
+
+    def cycles(self):
+        """
+            Returns all groups of repositories that depend on each other.
+
+            @returns {string[][]}
+        """
+
+        return [c for c in self.components() if len(c) > 1]
+
+    def topological_order(self):
+        """
+            Returns all repositories so that each one comes after its
+            dependencies. Repositories on a cycle are kept next to each other.
+
+            @returns {string[]}
+        """
+
+        return [r for c in self.components() for r in c]
+
+    def to_json(self):
+        """
+            Returns a JSON-serialisable representation of the graph.
+        """
+
+        return {
+            "repos": dict([(r, {
+                "installed": r in self.installed,
+                "manifest": sorted(self.manifest.get(r, ())),
+                "imports": sorted(self.imports.get(r, ())),
+                "dependencies": self.dependencies(r),
+                "dependents": self.dependents(r)
+            }) for r in self.repos()]),
+            "order": self.topological_order(),
+            "cycles": self.cycles()
+        }
+
+    def to_dot(self):
+        """
+            Returns the graph in the DOT language. Dependencies only found in
+            the MANIFEST.MF are dashed, imports missing from it are red.
+        """
+
+        lines = ["digraph dependencies {"]
+
+        for r in self.repos():
+            style = "" if r in self.installed else " [style=dotted]"
+            lines.append("    "+json.dumps(r)+style+";")
+
+        for r in self.repos():
+            for d in self.dependencies(r):
+                if not d in self.imports.get(r, ()):
+                    style = " [style=dashed]"
+                elif not d in self.manifest.get(r, ()):
+                    style = " [color=red]"
+                else:
+                    style = ""
+                lines.append("    "+json.dumps(r)+" -> "+json.dumps(d)+style+";")
+
+        lines.append("}")
+
+        return "\n".join(lines)
+
+def get_file_key(file):
+    """
+        Returns size and modification time of a file or None if it does not
+        exist.
+    """
+
+    try:
+        st = os.stat(file)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+def get_dependency_graph(refresh = False):
+    """
+        Returns the dependency graph of all installed repositories. Only
+        reads the MANIFEST.MF and dependency cache of repositories where they
+        changed since the graph was last built.
+
+        @param refresh {boolean} Crawl all repositories for imports again.
+            Otherwise imports are only crawled for new repositories and taken
+            from the dependency cache (as of the last lmh depcrawl) for all
+            others.
+
+        @returns {DependencyGraph}
+    """
+
+    try:
+        cache = json.loads(read_file(graph_file))
+        if cache.get("version") != graph_version:
+            cache = {}
+    except:
+        cache = {}
+
+    old = cache.get("repos", {})
+    new = {}
+
+    for repo in installed_repos(abs=False):
+        entry = dict(old.get(repo, {"manifest_key": False, "deps_key": False}))
+
+        if refresh or not "imports" in entry:
+            entry["imports"] = crawl_deps(repo)
+            entry["deps_key"] = get_file_key(get_depcache_file(repo))
+
+        key = get_file_key(get_depcache_file(repo))
+        if entry["deps_key"] != key:
+            entry["imports"] = sorted(set([d for e in read_depcache(repo).values() for d in e["deps"]]))
+            entry["deps_key"] = key
+
+        key = get_file_key(lmh_locate("content", repo, "META-INF", "MANIFEST.MF"))
+        if entry["manifest_key"] != key:
+            entry["manifest"] = sorted(get_package_dependencies(repo))
+            entry["manifest_key"] = key
+
+        new[repo] = entry
+
+    if new != old:
+        try:
+            mkdir_p(os.path.dirname(graph_file))
+            write_file(graph_file, json.dumps({"version": graph_version, "repos": new}))
+        except:
+            err("Unable to write dependency graph cache. ")
+
+    return DependencyGraph(
+        dict([(r, e["manifest"]) for (r, e) in new.items()]),
+        dict([(r, e["imports"]) for (r, e) in new.items()])
+    )
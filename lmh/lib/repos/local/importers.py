@@ -0,0 +1,146 @@
+"""
+Reverse import index of all installed repositories.
+
+For each .tex file the index stores which modules it imports, so that the
+files importing a given module can be found without reading every file in
+the workspace. Files are only read again when their size or modification
+time changes.
+
+Only imports naming a module are indexed. Imports by path (\\usemodule[...]
+and friends, \\MathHub{...}) have no module and are left out, so files that
+only use those are never found as importers and never rewritten by mvmod.
+"""
+
+import os
+import os.path
+import json
+
+from lmh.lib.io import err, read_file, write_file, walk_files
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import mkdir_p
+
+from lmh.lib.modules.imports import find_file_imports
+from lmh.lib.repos.local.registry import installed_repos
+from lmh.lib.repos.local.depcache import cached_deps
+
+"""Version of the index format. Indexes of other versions are ignored. """
+importers_version = 1
+
+def get_importers_file(repo):
+    """
+        Returns the file the import index of a repository is stored in.
+
+        @param repo {string} Name of the repository.
+    """
+
+    return lmh_locate("cache", "importers", repo+".json")
+
+def read_importers(repo):
+    """
+        Reads the import index of a repository. Returns an empty index if
+        there is none yet.
+
+        @param repo {string} Name of the repository.
+
+        @returns {dict}
+    """
+
+    try:
+        index = json.loads(read_file(get_importers_file(repo)))
+    except:
+        return {}
+
+    if index.get("version") != importers_version:
+        return {}
+
+    return index["files"]
+
+def write_importers(repo, index):
+    """
+        Writes the import index of a repository.
+
+        @param repo {string} Name of the repository.
+        @param index {dict} Index to write.
+    """
+
+    f = get_importers_file(repo)
+
+    try:
+        mkdir_p(os.path.dirname(f))
+        write_file(f, json.dumps({"version": importers_version, "files": index}))
+    except:
+        err("Unable to write import index for", repo)
+
+def file_modules(file):
+    """
+        Returns the modules imported by a file as pairs of target (None for
+        modules from the same repository) and module name. Imports by path
+        are dropped.
+    """
+
+    pairs = set([(i["target"], i["module"]) for i in find_file_imports(file) if i["module"] != None])
+    return [list(p) for p in sorted(pairs, key=lambda p: (p[0] or "", p[1]))]
+
+def update_importers(repo, stats):
+    """
+        Updates the import index of a repository.
+
+        @param repo {string} Name of the repository.
+        @param stats {dict} Counts hits (files taken from the index) and
+            misses (files read).
+
+        @returns {dict} Maps each file to the modules it imports.
+    """
+
+    old = read_importers(repo)
+    new = {}
+
+    res = {}
+    for file in walk_files(lmh_locate("content", repo), "tex"):
+        try:
+            res[file] = cached_deps(file, file_modules, old, new, stats)
+        except OSError:
+            pass
+
+    if new != old:
+        write_importers(repo, new)
+
+    return res
+
+def find_importers(source, modules, stats = None):
+    """
+        Finds all files that import some modules, either from another
+        repository or from the same one. Files that import them by path
+        only are not found.
+
+        @param source {string} Repository the modules are in.
+        @param modules {string[]} Paths of the modules relative to the
+            source folder of the repository.
+        @param stats {dict} Optional dict to count hits and misses in.
+
+        @returns {string[]}
+    """
+
+    if stats == None:
+        stats = {"hits": 0, "misses": 0}
+    stats.setdefault("hits", 0)
+    stats.setdefault("misses", 0)
+
+    # (target, module) pairs to look for, as written in other repositories.
+    wanted = set()
+    local = set()
+    for m in modules:
+        parts = (source + "/" + m).split("/")
+        wanted.add(("/".join(parts[:-1]), parts[-1]))
+        local.add(parts[-1])
+
+    res = []
+
+    for repo in installed_repos(abs=False):
+        for (file, imports) in update_importers(repo, stats).items():
+            for (target, module) in imports:
+                if (target, module) in wanted or (target == None and repo == source and module in local):
+                    res.append(file)
+                    break
+
+    return sorted(res)
@@ -24,10 +24,10 @@ def export(f = None):
         err("Unable to write %s" % f)
         return False
 
-def restore(file = None):
+def restore(file = None, jobs = None):
     """Restores a list of currently installed repositories. """
 
     # read all lines from the file
     lines = read_file_lines(file)
     lines = [l.strip() for l in lines]
-    return install(*lines)
+    return install(*lines, jobs=jobs)
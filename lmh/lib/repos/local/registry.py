@@ -0,0 +1,137 @@
+import os
+import os.path
+import glob
+import json
+import fnmatch
+import threading
+
+from lmh.lib.io import err, read_file, write_file
+from lmh.lib.dirs import lmh_locate
+from lmh.lib.utils import mkdir_p
+
+from lmh.lib.git import is_repo
+
+"""File to store the list of installed repositories in. """
+registry_file = lmh_locate("cache", "repos.json")
+
+# Lock and in-memory copy of the registry.
+__lock__ = threading.Lock()
+__registry__ = {}
+
+def get_mtimes():
+    """
+        Returns the modification times of the data directory and all group
+        directories. They change whenever a repository directory is created
+        or removed.
+
+        @returns {dict}
+    """
+
+    content = lmh_locate("content")
+
+    try:
+        mtimes = {".": os.stat(content).st_mtime}
+
+        for entry in os.scandir(content):
+            if not entry.name.startswith(".") and entry.is_dir():
+                mtimes[entry.name] = entry.stat().st_mtime
+    except OSError:
+        return {}
+
+    return mtimes
+
+def scan_repos():
+    """
+        Finds the names of all installed repositories by looking at the
+        filesystem.
+
+        @returns {string[]}
+    """
+
+    repos = filter(is_repo, glob.glob(lmh_locate("content", "*", "*")))
+    return sorted([os.path.relpath(r, lmh_locate("content")) for r in repos])
+
+def write_registry():
+    """
+        Writes the in-memory registry to disk. Needs to be called with the
+        lock held.
+    """
+
+    try:
+        mkdir_p(os.path.dirname(registry_file))
+        write_file(registry_file, json.dumps(__registry__, indent=4))
+    except:
+        err("Unable to write repository registry. ")
+
+def update_registry():
+    """
+        Re-scans all installed repositories and writes the registry.
+    """
+
+    with __lock__:
+        # get the mtimes first, so that changes during the scan are noticed.
+        __registry__["mtimes"] = get_mtimes()
+        __registry__["repos"] = scan_repos()
+        write_registry()
+
+def register_repo(name):
+    """
+        Adds a newly created repository to the registry.
+
+        @param name {string} Name of the repository.
+    """
+
+    installed_repos()
+
+    with __lock__:
+        __registry__["mtimes"] = get_mtimes()
+        __registry__["repos"] = sorted(set(__registry__["repos"] + [name]))
+        write_registry()
+
+def installed_repos(abs = True):
+    """
+        Returns all installed repositories. Uses the registry as long as no
+        repository directory has been created or removed since it was written.
+
+        @param abs {boolean} Return absolute paths instead of names.
+
+        @returns {string[]}
+    """
+
+    with __lock__:
+        if not "repos" in __registry__:
+            try:
+                __registry__.update(json.loads(read_file(registry_file)))
+            except:
+                pass
+
+        valid = "repos" in __registry__ and __registry__.get("mtimes") == get_mtimes()
+        repos = __registry__["repos"] if valid else None
+
+    if repos == None:
+        update_registry()
+        repos = __registry__["repos"]
+
+    if abs:
+        return [lmh_locate("content", r) for r in repos]
+
+    return list(repos)
+
+def glob_repos(pattern):
+    """
+        Finds all installed repositories matching a glob pattern of absolute
+        paths.
+
+        @param pattern {string} Pattern to match.
+
+        @returns {string[]}
+    """
+
+    # match component-wise, just like glob does.
+    parts = os.path.normpath(pattern).split(os.sep)
+
+    def matches(r):
+        rparts = r.split(os.sep)
+        return len(rparts) == len(parts) and all([fnmatch.fnmatchcase(a, b) for (a, b) in zip(rparts, parts)])
+
+    return list(filter(matches, installed_repos()))
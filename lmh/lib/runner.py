@@ -0,0 +1,131 @@
+"""
+Runner for external processes used by lmh.
+
+All processes are started through run(), which blocks until the process is
+done and can be called from any thread. A global limit on the number of
+processes (env::max_processes) is enforced no matter how many threads start
+them, and processes running longer than env::process_timeout are killed.
+"""
+
+import sys
+import threading
+import subprocess
+
+from subprocess import PIPE, DEVNULL, STDOUT
+
+from lmh.lib.io import err
+from lmh.lib.config import get_config
+
+# Limit on concurrent processes, created on first use.
+__semaphore__ = None
+__semaphore_lock__ = threading.Lock()
+
+def get_semaphore():
+    """
+    Returns the semaphore limiting the number of processes.
+    """
+
+    global __semaphore__
+
+    with __semaphore_lock__:
+        if __semaphore__ == None:
+            __semaphore__ = threading.BoundedSemaphore(max(get_config("env::max_processes"), 1))
+
+    return __semaphore__
+
+def run(args, cwd = None, env = None, input = None, stdout = PIPE, stderr = PIPE, timeout = None, on_line = None):
+    """
+    Runs a process, blocks until it is done and returns a tuple (returncode,
+    stdout, stderr) with the captured output as bytes (or None if it was not
+    captured).
+
+    @param args - Command and arguments.
+    @param cwd - Working directory.
+    @param env - Environment, inherited if None.
+    @param input - Bytes to write to stdin. If None, stdin is inherited.
+    @param stdout - PIPE to capture, None to inherit or a file.
+    @param stderr - PIPE to capture, None to inherit, STDOUT to merge or a file.
+    @param timeout - Timeout in seconds. Uses env::process_timeout if None,
+        0 disables it. The process is killed when it runs out.
+    @param on_line - Called with each line of stdout as soon as it has been
+        read. Needs stdout to be PIPE.
+    """
+
+    if timeout == None:
+        timeout = get_config("env::process_timeout")
+
+    # Make sure our own output comes before the one of the process.
+    if stdout == None or stderr == None:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    with get_semaphore():
+        proc = subprocess.Popen(args,
+            cwd=cwd, env=env,
+            stdin=PIPE if input != None else None,
+            stdout=stdout, stderr=stderr
+        )
+
+        expired = threading.Event()
+
+        def kill():
+            expired.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout > 0 else None
+
+        if timer != None:
+            timer.start()
+
+        try:
+            if on_line == None:
+                (out, errout) = proc.communicate(input)
+            else:
+                (out, errout) = communicate_lines(proc, input, on_line)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            if timer != None:
+                timer.cancel()
+
+    if expired.is_set():
+        err("Timed out after", timeout, "seconds:", " ".join(args))
+        return (proc.returncode, b"" if stdout == PIPE else None, b"" if stderr == PIPE else None)
+
+    return (proc.returncode, out, errout)
+
+def communicate_lines(proc, input, on_line):
+    """
+    Like proc.communicate(input), but calls on_line with each line of stdout
+    as soon as it has been read. stdin and stderr are handled in a helper
+    thread, so that none of the pipes can fill up.
+    """
+
+    errout = []
+
+    def feed():
+        if input != None:
+            try:
+                proc.stdin.write(input)
+            except BrokenPipeError:
+                pass
+            proc.stdin.close()
+        if proc.stderr != None:
+            errout.append(proc.stderr.read())
+            proc.stderr.close()
+
+    helper = threading.Thread(target=feed, daemon=True)
+    helper.start()
+
+    lines = []
+    for line in iter(proc.stdout.readline, b""):
+        on_line(line)
+        lines.append(line)
+    proc.stdout.close()
+
+    helper.join()
+    proc.wait()
+
+    return (b"".join(lines), errout[0] if len(errout) > 0 else None)
@@ -2,7 +2,12 @@
 Miscellaneous Utility functions
 """
 import functools
-import os, errno
+import itertools
+import collections
+import os, sys, errno
+import multiprocessing
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 
 def remove_doubles(lst):
@@ -16,7 +21,19 @@ def reduce(lst):
     """
     Flattens a list by joining nested lists of any level. 
     """
-    return sum(([x] if not isinstance(x, list) else reduce(x) for x in lst), [])
+    res = []
+    stack = [iter(lst)]
+
+    while len(stack) > 0:
+        for x in stack[-1]:
+            if isinstance(x, list):
+                stack.append(iter(x))
+                break
+            res.append(x)
+        else:
+            stack.pop()
+
+    return res
 
 def mkdir_p(path):
     """
@@ -34,4 +51,95 @@ def cached(f):
     """
     Decoration to cache functions. 
     """
-    return functools.lru_cache()(f)
\ No newline at end of file
+    return functools.lru_cache()(f)
+
+def default_jobs():
+    """
+    Returns the default number of parallel jobs, i.e. the number of CPUs.
+    """
+    return os.cpu_count() or 1
+
+def parallel_map(f, lst, jobs = None):
+    """
+    Maps f over lst using a bounded pool of worker threads. Results are
+    yielded lazily in the order of lst, each as soon as it and all of its
+    predecessors are done. With jobs = 1 no threads are used.
+    """
+
+    lst = list(lst)
+
+    if jobs == None:
+        jobs = default_jobs()
+
+    if jobs <= 1 or len(lst) <= 1:
+        for x in lst:
+            yield f(x)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(lst))) as executor:
+        for res in executor.map(f, lst):
+            yield res
+
+def process_pool(jobs):
+    """
+    Creates a pool of worker processes. Workers are not forked from lmh
+    itself, because a fork copies locks held by other threads, such as the
+    ones of the process runner, and can deadlock on them. Python versions
+    before 3.7 can not choose how a pool starts its workers and always fork.
+    """
+
+    if sys.version_info < (3, 7):
+        return ProcessPoolExecutor(max_workers=jobs)
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+    else:
+        context = multiprocessing.get_context("spawn")
+
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+
+def process_map(f, lst, jobs = None):
+    """
+    Like parallel_map, but uses a pool of worker processes for CPU-bound
+    work. f has to be a module-level function and its arguments and results
+    have to be picklable. lst is consumed lazily and only a bounded number
+    of items is handed to the pool ahead of the results. If there is only a
+    single item or jobs = 1, no processes are used.
+    """
+
+    if jobs == None:
+        jobs = default_jobs()
+
+    # look ahead, so that small inputs do not start more workers than needed.
+    it = iter(lst)
+    first = list(itertools.islice(it, jobs))
+    jobs = min(jobs, len(first))
+
+    if jobs <= 1:
+        for x in itertools.chain(first, it):
+            yield f(x)
+        return
+
+    with process_pool(jobs) as executor:
+        pending = collections.deque()
+
+        for x in itertools.chain(first, it):
+            pending.append(executor.submit(f, x))
+            if len(pending) >= 4 * jobs:
+                yield pending.popleft().result()
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+def chunks(lst, n):
+    """
+    Lazily splits an iterable into lists of at most n elements.
+    """
+
+    it = iter(lst)
+
+    while True:
+        chunk = list(itertools.islice(it, n))
+        if len(chunk) == 0:
+            return
+        yield chunk
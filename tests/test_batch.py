@@ -0,0 +1,133 @@
+"""
+Tests for atomic batches of file writes.
+"""
+
+import io
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from lmh.lib import batch
+from lmh.lib.batch import WriteBatch
+
+class TestWriteBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def create(self, name, text, mode = 0o644):
+        with open(self.path(name), "w") as f:
+            f.write(text)
+        os.chmod(self.path(name), mode)
+
+    def content(self, name):
+        with open(self.path(name)) as f:
+            return f.read()
+
+    def mode(self, name):
+        return stat.S_IMODE(os.stat(self.path(name)).st_mode)
+
+    def test_commit_writes_all_files(self):
+        self.create("a.tex", "old a\n", 0o640)
+        self.create("b.tex", "old b\n")
+
+        b = WriteBatch()
+        self.assertTrue(b.write(self.path("a.tex"), "new a\n"))
+        self.assertTrue(b.write(self.path("b.tex"), ["new b"]))
+        self.assertFalse(b.write(self.path("c.tex"), "c\n", old="c\n"))
+
+        self.assertTrue(b.commit())
+
+        self.assertEqual(self.content("a.tex"), "new a\n")
+        self.assertEqual(self.content("b.tex"), "new b\n")
+        self.assertEqual(self.mode("a.tex"), 0o640)
+        self.assertFalse(os.path.exists(self.path("c.tex")))
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["a.tex", "b.tex"])
+
+    def test_new_files_get_default_mode(self):
+        umask = os.umask(0o022)
+        try:
+            b = WriteBatch()
+            b.write(self.path("new.tex"), "new\n")
+            self.assertTrue(b.commit())
+        finally:
+            os.umask(umask)
+
+        self.assertEqual(self.content("new.tex"), "new\n")
+        self.assertEqual(self.mode("new.tex"), 0o644)
+
+    def test_failed_replace_restores_earlier_files(self):
+        self.create("a.tex", "old a\n", 0o640)
+        self.create("b.tex", "old b\n")
+
+        b = WriteBatch()
+        b.write(self.path("a.tex"), "new a\n")
+        b.write(self.path("b.tex"), "new b\n")
+        b.write(self.path("c.tex"), "new c\n")
+
+        replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(dst)
+            # the second file can not be put in place.
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return replace(src, dst)
+
+        with mock.patch.object(batch.os, "replace", failing_replace), mock.patch.object(batch, "err"):
+            self.assertFalse(b.commit())
+
+        # the first file was replaced and then restored.
+        self.assertEqual(calls[0], self.path("a.tex"))
+        self.assertEqual(calls[2], self.path("a.tex"))
+
+        self.assertEqual(self.content("a.tex"), "old a\n")
+        self.assertEqual(self.mode("a.tex"), 0o640)
+        self.assertEqual(self.content("b.tex"), "old b\n")
+        self.assertFalse(os.path.exists(self.path("c.tex")))
+
+        # and no temporary files are left behind.
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["a.tex", "b.tex"])
+
+    def test_dry_run_prints_diff(self):
+        self.create("a.tex", "one\ntwo\n")
+
+        b = WriteBatch(dry_run=True)
+        b.write(self.path("a.tex"), "one\nthree\n")
+        b.write(self.path("new.tex"), "new\n")
+
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as out:
+            self.assertTrue(b.commit())
+
+        self.assertEqual(out.getvalue(), "".join([
+            "--- a/a.tex\n",
+            "+++ b/a.tex\n",
+            "@@ -1,2 +1,2 @@\n",
+            " one\n",
+            "-two\n",
+            "+three\n",
+            "--- /dev/null\n",
+            "+++ b/new.tex\n",
+            "@@ -0,0 +1 @@\n",
+            "+new\n"
+        ]))
+
+        # nothing was written.
+        self.assertEqual(self.content("a.tex"), "one\ntwo\n")
+        self.assertFalse(os.path.exists(self.path("new.tex")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Tests for the literal prefilter of find and replace.
+"""
+
+import re
+import random
+import unittest
+
+from lmh.lib.repos import index
+from lmh.lib.repos.find_and_replace import compile_prefilter, may_match
+
+"""Patterns covering literals, groups, repeats, alternation, flags and assertions. """
+patterns = [
+    "abc",
+    "ab(c|a)b",
+    "a(bc)+a",
+    "a(bc){2}",
+    "ab?c",
+    "b{0,2}ca",
+    "(?:ab)*c",
+    "(?i)ABC",
+    "c(?i:AB)",
+    "ab(?=ca)",
+    "a(?!b)c",
+    "[ab]cab",
+    "(a)b\\1",
+    "^ab",
+    "a.c",
+    "\\\\importmodule\\[(a|b)\\]"
+]
+
+class TestPrefilter(unittest.TestCase):
+    def texts(self, n):
+        rand = random.Random(42)
+        for i in range(n):
+            yield "".join([rand.choice("abc\n") for j in range(rand.randint(0, 12))])
+
+    def test_prefilter_never_drops_a_match(self):
+        texts = list(self.texts(2000)) + ["\\importmodule[a]", "\\importmodule[b]"]
+
+        for p in patterns:
+            regex = re.compile(p, re.M)
+            prefilter = compile_prefilter("g/r", [p])
+            tris = index.pattern_trigrams(p)
+
+            for t in texts:
+                if regex.search(t) == None:
+                    continue
+
+                self.assertTrue(may_match(t, prefilter), (p, t))
+                self.assertTrue(prefilter[0][0] == None or prefilter[0][0] in t, (p, t))
+                self.assertTrue(tris.issubset(index.text_trigrams(t)), (p, t))
+
+    def test_prefilter_skips_files(self):
+        prefilter = compile_prefilter("g/r", ["\\\\importmodule\\[(a|b)\\]", "foo+bar"])
+
+        self.assertEqual(prefilter[0], ["\\importmodule[", "bar"])
+        self.assertTrue(may_match("\\importmodule[c]", prefilter))
+        self.assertTrue(may_match("a bar", prefilter))
+        self.assertFalse(may_match("\\usemodule[a] food", prefilter))
+
+    def test_patterns_without_literals(self):
+        prefilter = compile_prefilter("g/r", ["abc", "(?i)def"])
+
+        self.assertEqual(prefilter, (["abc", None], None))
+        self.assertTrue(may_match("", prefilter))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests for the reverse import index used by lmh mvmod.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from lmh.lib.repos.local import importers
+
+"""Files of the test workspace by repository. """
+workspace = {
+    "g/src": {
+        "mod.tex": "\\begin{module}[id=mod]\\end{module}\n",
+        "local.tex": "\\gimport{mod}\n",
+        "local_other.tex": "\\gimport{other}\n",
+        "local_mh.tex": "\\usemhmodule{mod}\n"
+    },
+    "g/user": {
+        "g.tex": "\\gimport[g/src]{mod}\n",
+        "mh.tex": "\\importmhmodule[repos=g/src,load=x]{mod}\n",
+        "other_module.tex": "\\gimport[g/src]{other}\n",
+        "other_repo.tex": "\\gimport[g/user]{mod}\n",
+        "same_name.tex": "\\gimport{mod}\n",
+        "path.tex": "\\usemodule[g/src/source/mod]\n\\MathHub{g/src/source/mod}\n"
+    }
+}
+
+class TestImporters(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+        for (repo, files) in workspace.items():
+            os.makedirs(os.path.join(self.tmp, "content", repo, "source"))
+            for (name, text) in files.items():
+                with open(self.path(repo, name), "w") as f:
+                    f.write(text)
+
+                # files changed just now are never cached.
+                t = time.time() - 3600
+                os.utime(self.path(repo, name), (t, t))
+
+        self.patches = [
+            mock.patch.object(importers, "lmh_locate", lambda *p: os.path.join(self.tmp, *p)),
+            mock.patch.object(importers, "installed_repos", lambda abs = True: sorted(workspace.keys()))
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmp)
+
+    def path(self, repo, name):
+        return os.path.join(self.tmp, "content", repo, "source", name)
+
+    def test_only_importers_are_found(self):
+        self.assertEqual(importers.find_importers("g/src", ["mod"]), sorted([
+            self.path("g/src", "local.tex"),
+            self.path("g/src", "local_mh.tex"),
+            self.path("g/user", "g.tex"),
+            self.path("g/user", "mh.tex")
+        ]))
+
+    def test_local_imports_of_other_repositories(self):
+        # \gimport{mod} in g/user imports g/user's own mod.
+        self.assertEqual(importers.find_importers("g/user", ["mod"]), sorted([
+            self.path("g/user", "other_repo.tex"),
+            self.path("g/user", "same_name.tex")
+        ]))
+
+    def test_path_imports_are_not_found(self):
+        self.assertNotIn(self.path("g/user", "path.tex"), importers.find_importers("g/src", ["mod"]))
+        self.assertEqual(importers.file_modules(self.path("g/user", "path.tex")), [])
+
+    def test_files_are_read_once(self):
+        stats = {}
+        importers.find_importers("g/src", ["mod"], stats)
+        self.assertEqual(stats, {"hits": 0, "misses": 10})
+
+        stats = {}
+        found = importers.find_importers("g/src", ["mod", "other"], stats)
+        self.assertEqual(stats, {"hits": 10, "misses": 0})
+        self.assertIn(self.path("g/user", "other_module.tex"), found)
+        self.assertIn(self.path("g/src", "local_other.tex"), found)
+
+if __name__ == '__main__':
+    unittest.main()
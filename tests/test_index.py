@@ -0,0 +1,181 @@
+"""
+Tests for the trigram index used by lmh find.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from lmh.lib.repos import index
+
+class TestIds(unittest.TestCase):
+    def test_round_trip(self):
+        ids = [0, 1, 2, 127, 128, 300, 16383, 16384, 2 ** 21, 2 ** 31 + 5]
+        data = index.encode_ids(ids)
+
+        self.assertEqual(index.decode_ids(data, 0, len(data)), ids)
+
+    def test_small_differences_take_one_byte(self):
+        self.assertEqual(len(index.encode_ids(range(100))), 100)
+        self.assertEqual(len(index.encode_ids([200])), 2)
+
+    def test_append_to_encoded_list(self):
+        first = index.encode_ids([3, 10, 500])
+        data = first + index.encode_ids([501, 9000], 500)
+
+        self.assertEqual(index.decode_ids(data, 0, len(data)), [3, 10, 500, 501, 9000])
+
+    def test_decode_slice(self):
+        data = b"xx" + index.encode_ids([5, 1000]) + b"yy"
+
+        self.assertEqual(index.decode_ids(data, 2, len(data) - 2), [5, 1000])
+
+class TestPatternLiterals(unittest.TestCase):
+    def test_plain_text(self):
+        self.assertEqual(index.pattern_literals(r"\\importmodule"), ["\\importmodule"])
+
+    def test_alternation(self):
+        self.assertEqual(index.pattern_literals("foo|bar"), [])
+        self.assertEqual(index.pattern_literals("x(?:foo|bar)y"), ["x", "y"])
+
+    def test_optional(self):
+        self.assertEqual(index.pattern_literals("colou?r"), ["colo", "r"])
+        self.assertEqual(index.pattern_literals("ab(cd)?ef"), ["ab", "ef"])
+
+    def test_bounded_repeats(self):
+        self.assertEqual(index.pattern_literals("ab{0,3}cd"), ["a", "cd"])
+        self.assertEqual(index.pattern_literals("a(bc){1,3}d"), ["a", "bc", "d"])
+        self.assertEqual(index.pattern_literals("a(bc)*d"), ["a", "d"])
+
+    def test_ignore_case(self):
+        self.assertEqual(index.pattern_literals("(?i)abc"), [])
+        self.assertEqual(index.pattern_literals("def(?i:xyz)"), ["def"])
+
+    def test_lookahead(self):
+        self.assertEqual(index.pattern_literals("abc(?=def)ghi"), ["abc", "ghi"])
+        self.assertEqual(index.pattern_literals("abc(?!def)ghi"), ["abc", "ghi"])
+
+    def test_invalid(self):
+        self.assertEqual(index.pattern_literals("abc("), [])
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "content", "g", "r")
+        self.index_file = os.path.join(self.tmp, "index", "g", "r.idx")
+        os.makedirs(os.path.join(self.root, "source"))
+
+        def match_repo(repo, abs = False):
+            return self.root if abs else repo
+
+        self.patches = [
+            mock.patch.object(index, "match_repo", match_repo),
+            mock.patch.object(index, "get_index_file", lambda repo: self.index_file)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmp)
+
+    def create(self, name, text, age = 3600):
+        """Creates a file, by default one that was last modified an hour ago. """
+
+        f = os.path.join(self.root, "source", name)
+        with open(f, "w") as out:
+            out.write(text)
+
+        t = time.time() - age
+        os.utime(f, (t, t))
+        return f
+
+    def candidates(self, *match):
+        res = index.index_candidates("g/r", list(match))
+        return None if res == None else sorted([os.path.basename(f) for f in res])
+
+    def test_no_index(self):
+        self.create("a.tex", "alpha")
+
+        self.assertEqual(self.candidates("alpha"), None)
+
+    def test_candidates(self):
+        self.create("a.tex", "the alpha module")
+        self.create("b.tex", "the beta module")
+
+        self.assertEqual(index.update_index("g/r"), {"indexed": 2, "updated": 2, "removed": 0})
+
+        self.assertEqual(self.candidates("alpha"), ["a.tex"])
+        self.assertEqual(self.candidates("module"), ["a.tex", "b.tex"])
+        self.assertEqual(self.candidates("gamma"), [])
+        self.assertEqual(self.candidates("alpha", "beta"), ["a.tex", "b.tex"])
+
+        # patterns without literal text need all files.
+        self.assertEqual(self.candidates("a|b"), ["a.tex", "b.tex"])
+
+    def test_update_after_change(self):
+        self.create("a.tex", "the alpha module")
+        self.create("b.tex", "the beta module")
+        index.update_index("g/r")
+
+        self.create("a.tex", "the gamma module", age=1800)
+
+        self.assertEqual(index.update_index("g/r"), {"indexed": 2, "updated": 1, "removed": 0})
+        self.assertEqual(self.candidates("alpha"), [])
+        self.assertEqual(self.candidates("gamma"), ["a.tex"])
+        self.assertEqual(self.candidates("beta"), ["b.tex"])
+
+        # nothing changed, so nothing is read.
+        self.assertEqual(index.update_index("g/r"), {"indexed": 2, "updated": 0, "removed": 0})
+
+    def test_update_after_delete(self):
+        self.create("a.tex", "the alpha module")
+        self.create("b.tex", "the beta module")
+        index.update_index("g/r")
+
+        os.remove(os.path.join(self.root, "source", "a.tex"))
+
+        self.assertEqual(index.update_index("g/r"), {"indexed": 1, "updated": 0, "removed": 1})
+        self.assertEqual(self.candidates("module"), ["b.tex"])
+
+    def test_racy_files_are_not_indexed(self):
+        self.create("a.tex", "the alpha module")
+        self.create("b.tex", "the beta module", age=0)
+
+        self.assertEqual(index.update_index("g/r"), {"indexed": 1, "updated": 1, "removed": 0})
+
+        # but still searched every time.
+        self.assertEqual(self.candidates("alpha"), ["a.tex", "b.tex"])
+        self.assertEqual(self.candidates("gamma"), ["b.tex"])
+
+    def test_stale_index(self):
+        self.create("a.tex", "the alpha module")
+        self.create("b.tex", "the beta module")
+        index.update_index("g/r")
+
+        # change and add files without updating the index.
+        self.create("a.tex", "the gamma module", age=1800)
+        self.create("c.tex", "the delta module")
+
+        self.assertEqual(self.candidates("gamma"), ["a.tex", "c.tex"])
+        self.assertEqual(self.candidates("beta"), ["a.tex", "b.tex", "c.tex"])
+
+    def test_compaction(self):
+        self.create("a.tex", "the alpha module")
+        index.update_index("g/r")
+
+        # every change uses a new id, so the index is rebuilt eventually.
+        for i in range(5):
+            self.create("a.tex", "the alpha module "+str(i), age=1800-i)
+            index.update_index("g/r")
+
+        self.assertLessEqual(len(index.read_index("g/r")["files"]), 2)
+        self.assertEqual(self.candidates("alpha"), ["a.tex"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+"""
+Tests for the shared file walker.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lmh.lib.io import walk_files
+
+class TestWalkFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+        for f in ["a/x.tex", "a/y.txt", "a/b/z.tex", "a/.git/config.tex", "a/nested/.git/HEAD", "a/nested/n.tex", "other/o.tex"]:
+            path = os.path.join(self.tmp, f)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def walk(self, *ext):
+        root = os.path.join(self.tmp, "a")
+        return [os.path.relpath(f, root) for f in walk_files(root, *ext)]
+
+    def test_order_and_pruning(self):
+        self.assertEqual(self.walk("tex"), ["x.tex", "b/z.tex"])
+        self.assertEqual(self.walk(), ["x.tex", "y.txt", "b/z.tex"])
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symbolic links are not supported")
+    def test_symlinks_are_followed_once(self):
+        os.symlink(os.path.join(self.tmp, "other"), os.path.join(self.tmp, "a", "link"))
+        os.symlink(os.path.join(self.tmp, "other"), os.path.join(self.tmp, "a", "b", "same"))
+        os.symlink(os.path.join(self.tmp, "a"), os.path.join(self.tmp, "a", "b", "loop"))
+
+        self.assertEqual(self.walk("tex"), ["x.tex", "b/z.tex", "b/same/o.tex"])
+
+if __name__ == '__main__':
+    unittest.main()
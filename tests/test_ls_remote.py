@@ -0,0 +1,165 @@
+"""
+Tests for lmh ls-remote against a local HTTP server serving canned pages.
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import socketserver
+
+from unittest import mock
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from lmh.lib.repos import indexer
+
+"""Number of projects on each canned page, the last one is partial. """
+page_sizes = [indexer.projects_per_page, indexer.projects_per_page, 5]
+
+def canned_page(i):
+    """
+        Returns the canned html of a page and its projects.
+    """
+
+    count = page_sizes[i-1] if i <= len(page_sizes) else 0
+    projects = ["group/page"+str(i)+"_"+str(j) for j in range(count)]
+    links = "".join(["<li><a class='project' href='/"+p+"'>"+p+"</a></li>" for p in projects])
+    return ("<html><body><ul>"+links+"</ul></body></html>", projects)
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class CannedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+
+        try:
+            # give other requests a chance to overlap
+            time.sleep(0.05)
+
+            i = int(parse_qs(urlparse(self.path).query)["page"][0])
+            (body, projects) = canned_page(i)
+            etag = '"page-'+str(i)+'"'
+
+            with server.lock:
+                server.requests.append((i, self.headers.get("If-None-Match")))
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+@unittest.skipIf(indexer.lxml == False, "lxml is not installed")
+class TestLsRemote(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CannedHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.active = 0
+        self.server.max_active = 0
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.url = "http://127.0.0.1:"+str(self.server.server_address[1])+"/public/"
+
+        self.tmp = tempfile.mkdtemp()
+        self.catalog = os.path.join(self.tmp, "remote.json")
+
+        get_config = indexer.get_config
+        def config(key):
+            if key == "gl::projects_url":
+                return self.url
+            return get_config(key)
+
+        self.patches = [
+            mock.patch.object(indexer, "get_config", config),
+            mock.patch.object(indexer, "remote_catalog_file", self.catalog)
+        ]
+        for p in self.patches:
+            p.start()
+
+        # do not reuse connections to servers of other tests
+        indexer.__connections__.conns = {}
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def all_projects(self):
+        res = set()
+        for i in range(1, len(page_sizes) + 1):
+            res.update(canned_page(i)[1])
+        return res
+
+    def test_pages_are_fetched_concurrently(self):
+        indexer.get_remote_projects()
+
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_last_partial_page_is_included(self):
+        projects = indexer.get_remote_projects()
+
+        self.assertEqual(projects, self.all_projects())
+        self.assertEqual(len(projects), 2 * indexer.projects_per_page + 5)
+
+        # only pages up to the partial one are kept.
+        with open(self.catalog) as f:
+            catalog = json.load(f)
+        self.assertEqual(sorted(catalog.keys()), ["1", "2", "3"])
+
+    def test_pages_are_revalidated(self):
+        first = indexer.get_remote_projects()
+        self.server.requests = []
+
+        second = indexer.get_remote_projects()
+
+        self.assertEqual(first, second)
+
+        # each known page is requested with its ETag and not sent again.
+        revalidated = dict([(i, etag) for (i, etag) in self.server.requests if i <= len(page_sizes)])
+        self.assertEqual(revalidated, dict([(i, '"page-'+str(i)+'"') for i in range(1, len(page_sizes) + 1)]))
+
+    def test_offline_uses_catalog(self):
+        indexer.get_remote_projects()
+
+        self.server.requests = []
+        self.url = "http://127.0.0.1:1/public/"
+
+        self.assertEqual(indexer.get_remote_projects(offline=True), self.all_projects())
+        self.assertEqual(indexer.ls_remote("group/page3_*", offline=True), sorted(canned_page(3)[1]))
+        self.assertEqual(self.server.requests, [])
+
+    def test_offline_without_catalog(self):
+        self.assertEqual(indexer.get_remote_projects(offline=True), set())
+        self.assertEqual(self.server.requests, [])
+
+if __name__ == '__main__':
+    unittest.main()